@@ -7,7 +7,14 @@ import ConstraintNetwork
 import time
 import random
 import math
-import operator
+import Tournament
+import HeuristicScores
+import SATSolver
+import SudokuCNF
+import Pattern
+
+# Probing only tries variables with at most this many values
+PROBE_DOMAIN_SIZE = 3
 
 class BTSolver:
 
@@ -15,15 +22,107 @@ class BTSolver:
     # Constructors
     # ==================================================================
 
-    def __init__ ( self, gb, trail, val_sh, var_sh, cc ):
+    def __init__ ( self, gb, trail, val_sh, var_sh, cc, engine = "", nogoodSize = 0, probeBudget = 0 ):
         self.network = ConstraintNetwork.ConstraintNetwork(gb)
         self.hassolution = False
         self.gameboard = gb
         self.trail = trail
 
+        self.requestedHeuristics = ( var_sh, val_sh, cc )
         self.varHeuristics = var_sh
         self.valHeuristics = val_sh
         self.cChecks = cc
+        self.engine = engine
+        self.nogoodSize = nogoodSize
+        self.solution = None
+        self.satStats = None
+        self.scores = None
+        self.recorder = None
+        self.tryPattern = True
+        self.probeBudget = probeBudget
+        self.probeCache = dict()
+        self.probeStats = { "probes" : 0, "cached" : 0, "pruned" : 0 }
+        self.resetWeights()
+        self.selectTournamentHeuristics()
+        self.updateScores()
+
+    """
+        Loads a new board into this solver. Boards of the same geometry
+        reuse the existing network topology; only the domains are rewritten.
+    """
+    def reset ( self, gb ):
+        if self.network.hasGeometry( gb ):
+            self.network.reset( gb )
+        else:
+            self.network = ConstraintNetwork.ConstraintNetwork( gb )
+        self.hassolution = False
+        self.gameboard = gb
+        self.solution = None
+        self.satStats = None
+        self.tryPattern = True
+        self.probeCache = dict()
+        self.probeStats = { "probes" : 0, "cached" : 0, "pruned" : 0 }
+        self.resetWeights()
+        self.trail.clear()
+        self.selectTournamentHeuristics()
+        self.updateScores()
+        self.attachRecorder()
+
+    """
+        Resolves the TOURN placeholders (tournVar, tournVal, tournCC) to
+        concrete heuristics chosen from the board's features. Heuristics
+        that were requested explicitly are left as they are.
+    """
+    def selectTournamentHeuristics ( self ):
+        var_sh, val_sh, cc = self.requestedHeuristics
+        if var_sh != "tournVar" and val_sh != "tournVal" and cc != "tournCC":
+            return
+
+        features = Tournament.extractFeatures( self.gameboard )
+        t_var, t_val, t_cc = Tournament.selectHeuristics( features )
+
+        self.varHeuristics = t_var if var_sh == "tournVar" else var_sh
+        self.valHeuristics = t_val if val_sh == "tournVal" else val_sh
+        self.cChecks = t_cc if cc == "tournCC" else cc
+
+    # Maintains incremental heuristic scores when a heuristic needs them
+    def updateScores ( self ):
+        needed = self.varHeuristics == "MRVwithTieBreaker" or self.valHeuristics == "LeastConstrainingValue"
+
+        if self.scores != None and ( not needed or self.scores.network != self.network ):
+            self.scores.detach()
+            self.scores = None
+
+        if not needed:
+            return
+
+        if self.scores == None:
+            self.scores = HeuristicScores.HeuristicScores( self.network )
+        else:
+            self.scores.rebuild()
+
+    """
+        Records the search to a SearchTrace.TraceRecorder, or stops
+        recording if recorder is None.
+    """
+    def setTraceRecorder ( self, recorder ):
+        self.recorder = recorder
+        if recorder == None:
+            self.trail.setListener( None )
+            for v in self.network.getVariables():
+                v.setListener( self.scores )
+        self.attachRecorder()
+
+    # Puts the recorder in front of the variables' listeners and starts a board
+    def attachRecorder ( self ):
+        if self.recorder == None:
+            return
+
+        self.recorder.next = self.scores
+        for v in self.network.getVariables():
+            v.setListener( self.recorder )
+        self.trail.setListener( self.recorder )
+        self.recorder.startBoard( self.gameboard, self.trail )
 
     # ==================================================================
     # Consistency Checks
@@ -48,6 +147,7 @@ class BTSolver:
                         vNeighbor.removeValueFromDomain(v.getAssignment())
                         returnDict[vNeighbor] = vNeighbor.getDomain()
                         if vNeighborDomain.size() == 0:
+                            self.failedBetween(v, vNeighbor)
                             return (returnDict,False)
 
         return (returnDict,self.network.isConsistent())
@@ -82,6 +182,7 @@ class BTSolver:
                         vNeighbor.removeValueFromDomain(v.getAssignment())
                         returnDict[vNeighbor] = vNeighbor.getDomain()
                         if vNeighborDomain.size() == 0:
+                            self.failedBetween(v, vNeighbor)
                             return (returnDict,False)
             else: # v not assigned
                 if v.getDomain().size() == 1:
@@ -90,6 +191,7 @@ class BTSolver:
                     returnDict[v] = v.getAssignment()
                     consistent = self.network.isConsistent()
                     if not consistent:
+                        self.failedAt(v)
                         return ({},False)
 
         #########################
@@ -103,6 +205,7 @@ class BTSolver:
                     counterArray[value - 1] += 1
             for i in range(1, self.gameboard.N + 1): # 1 - 9
                 if counterArray[i - 1] == 0:
+                    self.constraintFailed(constraint)
                     return (returnDict, False)
                 elif counterArray[i - 1] == 1 and not variableArray[i - 1].isAssigned():
                     self.trail.push(variableArray[i - 1])
@@ -110,9 +213,123 @@ class BTSolver:
                     returnDict[variableArray[i - 1]] = i
                     consistent = self.network.isConsistent()
                     if not consistent:
+                        self.failedAt(variableArray[i - 1])
                         return ({},False)
         return (returnDict, self.network.isConsistent())
 
+    # =================================================================
+    # Constraint Failure Weights
+    # =================================================================
+
+    """
+        Every wipeout found by a consistency check adds 1 to the weight of
+        the constraint it came through, and wdeg keeps each variable's sum
+        of its constraints' weights up to date for getDomOverWdeg.
+        Weights start at 1 for each board and survive backtracking.
+    """
+    def resetWeights ( self ):
+        self.wdeg = [ sum( c.weight for c in constraints ) for constraints in self.network.constraintsOf ]
+
+    def constraintFailed ( self, c ):
+        c.weight += 1
+        N = self.gameboard.N
+        for x in c.vars:
+            self.wdeg[x.row * N + x.col] += 1
+
+    # Blames the constraints v and w share, after v's value wiped out w
+    def failedBetween ( self, v, w ):
+        for c in self.network.getConstraintsContainingVariable( v ):
+            if c in self.network.getConstraintsContainingVariable( w ):
+                self.constraintFailed( c )
+
+    # Blames the constraints of v that its assignment violates
+    def failedAt ( self, v ):
+        for c in self.network.getConstraintsContainingVariable( v ):
+            if not c.isConsistent():
+                self.constraintFailed( c )
+
+    # =================================================================
+    # Singleton Consistency Probing
+    # =================================================================
+
+    """
+        Tentatively assigns each value of the unassigned variables with at
+        most PROBE_DOMAIN_SIZE values, smallest domains first, runs the
+        selected consistency check and undoes it. Values that fail are
+        removed on the trail, so they come back when this node is undone.
+        At most probeBudget probes run per call. Returns false if a domain
+        is wiped out.
+
+        Probes that run the full check (anything but forward checking, see
+        probeValue) are cached when they succeed, keyed by the variable's
+        neighbor domains, and skipped while those are unchanged. Only
+        successes are cached, and norvigCheck can reach past the neighbors,
+        so a stale entry can cost pruning but never removes a good value.
+    """
+    def probe ( self ):
+        budget = self.probeBudget
+        pruned = False
+        useCache = self.cChecks != "forwardChecking"
+
+        candidates = [ v for v in self.network.variables if not v.isAssigned() and 1 < v.size() <= PROBE_DOMAIN_SIZE ]
+        candidates.sort( key = lambda v: v.size() )
+
+        for v in candidates:
+            if budget <= 0:
+                break
+            signature = self.probeSignature( v ) if useCache else None
+
+            for value in list( v.getValues() ):
+                if budget <= 0:
+                    break
+
+                key = ( v.row, v.col, value )
+                if useCache and self.probeCache.get( key ) == signature:
+                    self.probeStats["cached"] += 1
+                    continue
+
+                budget -= 1
+                self.probeStats["probes"] += 1
+                if self.probeValue( v, value ):
+                    if useCache:
+                        self.probeCache[key] = signature
+                    continue
+
+                self.probeStats["pruned"] += 1
+                self.trail.push( v )
+                v.removeValueFromDomain( value )
+                pruned = True
+                if v.size() == 0:
+                    return False
+
+        if pruned:
+            return self.checkConsistency()
+        return True
+
+    """
+        Returns true if assigning value to v survives the selected
+        consistency check. Forward checking from an already checked node
+        only fails if a neighbor has nothing left but value, so that case is
+        answered from the neighbors without touching the trail.
+    """
+    def probeValue ( self, v, value ):
+        if self.cChecks == "forwardChecking":
+            for neighbor in self.network.getNeighborsOfVariable( v ):
+                if neighbor.size() == 1 and neighbor.getValues()[0] == value:
+                    return False
+            return True
+
+        self.trail.placeTrailMarker()
+        self.trail.push( v )
+        v.assignValue( value )
+        consistent = self.checkConsistency()
+        self.trail.undo()
+        return consistent
+
+    # The neighbor domains a probe of v depends on
+    def probeSignature ( self, v ):
+        return tuple( tuple( neighbor.getValues() ) for neighbor in self.network.getNeighborsOfVariable( v ) )
+
     # ==================================================================
     # Variable Selectors
     # ==================================================================
@@ -135,6 +352,7 @@ class BTSolver:
                 minVariable = v
         return minVariable
 
+    # MRV, breaking ties by the most unassigned peers
     def MRVwithTieBreaker ( self ):
         smallestDomainList = [None]
         min = math.inf
@@ -147,26 +365,30 @@ class BTSolver:
                 smallestDomainList.append(v)
 
         if len(smallestDomainList) > 1:
-            for v in smallestDomainList:
-                dictionary = {}
-                counter = 0
-                for vNeighbor in self.network.getNeighborsOfVariable(v):
-                    affected = False
-                    for value in v.domain.values:
-                        if vNeighbor.domain.contains(value):
-                            affected = True
-                    if affected:
-                        counter += 1
-                dictionary[v] = counter
-
-            sortedListOfTuples = sorted(dictionary.items(), key=operator.itemgetter(1))
-            while (sortedListOfTuples[0][1] != sortedListOfTuples[-1][1]):
-                sortedListOfTuples.pop(0)
-            return [key for key,value in sortedListOfTuples]
+            maxDegree = max( self.scores.getDegree(v) for v in smallestDomainList )
+            return [ v for v in smallestDomainList if self.scores.getDegree(v) == maxDegree ]
 
         else:
             return smallestDomainList
 
+    # Smallest domain size over summed constraint failure weight. Cells with
+    # one value left are forced, so they go first whatever their weight
+    def getDomOverWdeg ( self ):
+        best = math.inf
+        bestVariable = None
+        wdeg = self.wdeg
+        N = self.gameboard.N
+        for v in self.network.variables:
+            if not v.isAssigned():
+                size = v.domain.size()
+                if size <= 1:
+                    return v
+                score = size / wdeg[v.row * N + v.col]
+                if score < best:
+                    best = score
+                    bestVariable = v
+        return bestVariable
+
     # ==================================================================
     # Value Selectors
     # ==================================================================
@@ -176,23 +398,26 @@ class BTSolver:
         values = v.domain.values
         return sorted( values )
 
+    # Values ordered by how few peers still have them in their domain
     def getValuesLCVOrder ( self, v ):
-        dictionary = {}
-        for value in v.domain.values:
-            counter = 0
-            for vNeighbor in self.network.getNeighborsOfVariable(v):
-                if vNeighbor.domain.contains(value):
-                    counter += 1
-            dictionary[value] = counter
-
-        sortedListOfTuples = sorted(dictionary.items(), key=operator.itemgetter(1))
-        return [key for key,value in sortedListOfTuples]
+        support = self.scores.support[ self.scores.indexOf(v) ]
+        return sorted( v.domain.values, key = lambda value: support[value] )
 
     # ==================================================================
     # Engine Functions
     # ==================================================================
 
     def solve ( self, time_left=600):
+        if self.tryPattern:
+            self.tryPattern = False
+            if self.completeFromPattern():
+                return 0
+
+        if self.engine == "conflictDirectedBackjumping":
+            return self.solveCBJ( time_left )
+        if self.engine == "cdclSAT":
+            return self.solveSAT( time_left )
+
         if time_left <= 60:
             return -1
 
@@ -200,6 +425,10 @@ class BTSolver:
         if self.hassolution:
             return 0
 
+        # Remove values that fail under propagation before branching
+        if self.probeBudget > 0 and not self.probe():
+            return 0
+
         # Variable Selection
         v = self.selectNextVariable()
 
@@ -217,6 +446,8 @@ class BTSolver:
             self.trail.push( v )
 
             # Assign the value
+            if self.recorder != None:
+                self.recorder.decision( v, i )
             v.assignValue( i )
 
             # Propagate constraints, check consistency, recur
@@ -235,7 +466,24 @@ class BTSolver:
         
         return 0
 
+    """
+        Sparse boards are completed directly from a permuted pattern grid
+        (see Pattern.py) when one fits their assignments. Tried once per
+        board, before the search engine runs.
+    """
+    def completeFromPattern ( self ):
+        solution = Pattern.completeNetwork( self.network, self.gameboard.p, self.gameboard.q )
+        if solution == None:
+            return False
+
+        self.solution = solution
+        self.hassolution = True
+        return True
+
     def checkConsistency ( self ):
+        if self.recorder != None:
+            self.recorder.propagate( self.cChecks if self.cChecks in ["forwardChecking", "norvigCheck"] else "assignmentsCheck" )
+
         if self.cChecks == "forwardChecking":
             return self.forwardChecking()[1]
         if self.cChecks == "norvigCheck":
@@ -248,6 +496,8 @@ class BTSolver:
             return self.getMRV()
         if self.varHeuristics == "MRVwithTieBreaker":
             return self.MRVwithTieBreaker()[0]
+        if self.varHeuristics == "domOverWdeg":
+            return self.getDomOverWdeg()
         else:
             return self.getfirstUnassignedVariable()
 
@@ -258,4 +508,174 @@ class BTSolver:
             return self.getValuesInOrder( v )
 
     def getSolution ( self ):
+        if self.solution != None:
+            return self.solution
         return self.network.toSudokuBoard(self.gameboard.p, self.gameboard.q)
+
+    # ==================================================================
+    # Conflict-Directed Backjumping
+    # ==================================================================
+
+    """
+        Search with forward checking and conflict-directed backjumping.
+
+        Every wipeout is explained by the set of search assignments that
+        pruned the wiped-out variable. When all values of a variable fail,
+        the union of those explanations is its conflict set, and search jumps
+        straight back to the most recent variable in it instead of the
+        previous one. Conflict sets of at most nogoodSize assignments are
+        also kept as nogoods and checked on later assignments.
+
+        Propagation is forward checking from the newly assigned variable,
+        whatever the selected consistency check, since that is what the
+        explanations describe. Uses the same time_left convention as solve().
+    """
+    def solveCBJ ( self, time_left=600 ):
+        if self.hassolution:
+            return 0
+
+        self.deadline = time.time() + time_left - 60
+        self.searchDepth = dict()
+        self.nogoods = dict()
+
+        if not self.forwardChecking()[1]:
+            return 0
+
+        if self.backjump( 1 ) == -1:
+            return -1
+        return 0
+
+    """
+        Returns None once a solution is found, -1 on timeout, or otherwise
+        the conflict set of search variables responsible for the failure.
+    """
+    def backjump ( self, depth ):
+        if time.time() > self.deadline:
+            return -1
+
+        v = self.selectNextVariable()
+        if v == None:
+            self.hassolution = True
+            return None
+
+        conflicts = set()
+        for i in self.getNextValues( v ):
+            self.trail.placeTrailMarker()
+            self.trail.push( v )
+            if self.recorder != None:
+                self.recorder.decision( v, i )
+            v.assignValue( i )
+            self.searchDepth[v] = depth
+
+            failure = self.explainedForwardCheck( v )
+            if failure == None:
+                failure = self.violatedNogood( v, i )
+
+            if failure == None:
+                result = self.backjump( depth + 1 )
+                if self.hassolution or result == -1:
+                    return result
+
+                if v not in result:
+                    # v played no part in the failure, keep jumping back
+                    del self.searchDepth[v]
+                    self.trail.undo()
+                    return result
+
+                result.discard( v )
+                conflicts |= result
+            else:
+                conflicts |= failure
+
+            del self.searchDepth[v]
+            self.trail.undo()
+
+        # v is undone now; only its live ancestors explain the failure
+        conflicts.discard( v )
+        conflicts |= self.prunedBy( v )
+        self.recordNogood( conflicts )
+        return conflicts
+
+    # Returns the search variables whose assignments were pruned from v's domain
+    def prunedBy ( self, v ):
+        culprits = set()
+        for vNeighbor in self.network.getNeighborsOfVariable( v ):
+            if vNeighbor in self.searchDepth and not v.getDomain().contains( vNeighbor.getAssignment() ):
+                culprits.add( vNeighbor )
+        return culprits
+
+    """
+        Removes v's assignment from its neighbors. Returns None if no domain
+        was wiped out, otherwise the conflict set explaining the wipeout.
+    """
+    def explainedForwardCheck ( self, v ):
+        if self.recorder != None:
+            self.recorder.propagate( "explainedForwardCheck" )
+
+        value = v.getAssignment()
+        for vNeighbor in self.network.getNeighborsOfVariable( v ):
+            if vNeighbor.getDomain().contains( value ):
+                if not vNeighbor.isChangeable():
+                    self.failedBetween( v, vNeighbor )
+                    return { v }
+
+                self.trail.push( vNeighbor )
+                vNeighbor.removeValueFromDomain( value )
+                if vNeighbor.getDomain().isEmpty():
+                    self.failedBetween( v, vNeighbor )
+                    return self.prunedBy( vNeighbor )
+
+        return None
+
+    # Returns the variables of a stored nogood made true by v = value, or None
+    def violatedNogood ( self, v, value ):
+        for nogood in self.nogoods.get( (v, value), [] ):
+            if all( x in self.searchDepth and x.getAssignment() == xValue for x, xValue in nogood ):
+                return set( x for x, xValue in nogood )
+        return None
+
+    def recordNogood ( self, conflicts ):
+        if len( conflicts ) == 0 or len( conflicts ) > self.nogoodSize:
+            return
+
+        nogood = frozenset( (x, x.getAssignment()) for x in conflicts )
+        for literal in nogood:
+            self.nogoods.setdefault( literal, set() ).add( nogood )
+
+    # ==================================================================
+    # SAT Backend
+    # ==================================================================
+
+    """
+        Encodes the board as CNF and solves it with the built-in CDCL solver.
+        The network and trail are not used. Conflict, propagation, decision
+        and restart counts are left in satStats. Uses the same time_left
+        convention as solve().
+    """
+    def solveSAT ( self, time_left=600 ):
+        if self.hassolution:
+            return 0
+
+        deadline = time.time() + time_left - 60
+        cnf = SudokuCNF.SudokuCNF( self.gameboard )
+        sat = SATSolver.SATSolver( cnf.numVars )
+        for clause in cnf.clauses:
+            if not sat.addClause( clause ):
+                break
+
+        result = sat.solve( deadline )
+        self.satStats = {
+            "variables"    : cnf.numVars,
+            "clauses"      : len( cnf.clauses ),
+            "conflicts"    : sat.conflicts,
+            "propagations" : sat.propagations,
+            "decisions"    : sat.decisions,
+            "restarts"     : sat.restarts,
+        }
+
+        if result == None:
+            return -1
+        if result:
+            self.hassolution = True
+            self.solution = cnf.decode( sat.getModel() )
+        return 0
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import sys
+import time
+import zlib
+
+"""
+    Checkpoints for resumable, sharded batch runs.
+
+    A checkpoint is a JSON file recording which boards of a batch (file
+    names for a directory, indices for a corpus) have been solved, plus the
+    aggregate statistics so far. It is rewritten atomically every few
+    boards, so a restarted run skips exactly the completed boards.
+
+    Sharding partitions a batch without any coordination: corpus index k
+    belongs to shard k mod n, and file name f to shard crc32(f) mod n.
+    Checkpoints of the shards can then be combined with merge().
+"""
+
+STAT_KEYS = [ "boards", "solutions", "pushes", "backtracks", "conflicts", "propagations" ]
+
+# Parses "i/n" into (i, n); raises ValueError unless 0 <= i < n
+def parseShard ( text ):
+    try:
+        index, count = [ int(part) for part in text.split( "/" ) ]
+    except ValueError:
+        raise ValueError( "Shard must look like i/n, got " + text )
+
+    if count < 1 or index < 0 or index >= count:
+        raise ValueError( "Shard index must be in 0.." + str(count - 1) + ", got " + text )
+    return ( index, count )
+
+# Returns true if the board key (corpus index or file name) is in the shard
+def inShard ( key, shard ):
+    index, count = shard
+    if isinstance( key, int ):
+        return key % count == index
+    return zlib.crc32( key.encode() ) % count == index
+
+class Checkpoint:
+
+    # ==================================================================
+    # Constructors
+    # ==================================================================
+
+    """
+        Opens the checkpoint at path, resuming from it if it exists. source
+        names the batch and config the solver settings; both must match the
+        checkpoint being resumed.
+    """
+    def __init__ ( self, path, source, shard = (0, 1), config = None, every = 10, interval = 60.0 ):
+        self.path = path
+        self.source = os.path.basename( os.path.normpath( source ) )
+        self.shard = list( shard )
+        self.config = config if config != None else []
+        self.every = every
+        self.interval = interval
+
+        self.completed = set()
+        self.stats = dict( (key, 0) for key in STAT_KEYS )
+        self.finished = False
+
+        self.unsaved = 0
+        self.lastSave = time.time()
+
+        if os.path.exists( path ):
+            self.load()
+
+    # ==================================================================
+    # Persistence
+    # ==================================================================
+
+    def load ( self ):
+        with open( self.path ) as f:
+            data = json.load( f )
+
+        if data.get( "source" ) != self.source or data.get( "shard" ) != self.shard:
+            raise ValueError( "Checkpoint " + self.path + " is for " + str(data.get( "source" )) + " shard "
+                              + str(data.get( "shard" )) + ", not " + self.source + " shard " + str(self.shard) )
+        if data.get( "config" ) != self.config:
+            raise ValueError( "Checkpoint " + self.path + " was written with settings " + str(data.get( "config" )) )
+
+        self.completed = set( data["completed"] )
+        self.stats.update( data["stats"] )
+        self.finished = data.get( "finished", False )
+
+    # Writes the checkpoint to a temporary file and renames it into place
+    def save ( self ):
+        data = {
+            "source"    : self.source,
+            "shard"     : self.shard,
+            "config"    : self.config,
+            "finished"  : self.finished,
+            "stats"     : self.stats,
+            "completed" : sorted( self.completed, key = str ),
+        }
+
+        temp = self.path + ".tmp"
+        with open( temp, "w" ) as f:
+            json.dump( data, f )
+            f.flush()
+            os.fsync( f.fileno() )
+        os.replace( temp, self.path )
+
+        self.unsaved = 0
+        self.lastSave = time.time()
+
+    # ==================================================================
+    # Progress
+    # ==================================================================
+
+    def isDone ( self, key ):
+        return key in self.completed
+
+    # Records a finished board; stats holds its counts for STAT_KEYS
+    def record ( self, key, stats ):
+        self.completed.add( key )
+        for name in STAT_KEYS:
+            self.stats[name] += stats.get( name, 0 )
+
+        self.unsaved += 1
+        if self.unsaved >= self.every or time.time() - self.lastSave >= self.interval:
+            self.save()
+
+    def finish ( self ):
+        self.finished = True
+        self.save()
+
+# ==================================================================
+# Merging
+# ==================================================================
+
+"""
+    Combines shard checkpoints of one batch into a single summary with the
+    summed statistics. Raises ValueError if they come from different
+    batches or settings, or if two shards completed the same board.
+"""
+def merge ( paths ):
+    merged = None
+    for path in paths:
+        with open( path ) as f:
+            data = json.load( f )
+
+        if merged == None:
+            merged = {
+                "source"    : data["source"],
+                "config"    : data["config"],
+                "shards"    : [],
+                "finished"  : True,
+                "stats"     : dict( (key, 0) for key in STAT_KEYS ),
+                "completed" : [],
+            }
+        elif data["source"] != merged["source"] or data["config"] != merged["config"]:
+            raise ValueError( path + " is from a different batch or uses different settings" )
+
+        overlap = set( merged["completed"] ) & set( data["completed"] )
+        if overlap:
+            raise ValueError( path + " repeats " + str(len(overlap)) + " completed boards" )
+
+        merged["shards"].append( data["shard"] )
+        merged["finished"] = merged["finished"] and data.get( "finished", False )
+        merged["completed"] += data["completed"]
+        for key in STAT_KEYS:
+            merged["stats"][key] += data["stats"].get( key, 0 )
+
+    if merged == None:
+        raise ValueError( "No checkpoints to merge" )
+
+    shardCounts = set( count for index, count in merged["shards"] )
+    shardIndices = set( index for index, count in merged["shards"] )
+    merged["missingShards"] = []
+    if len( shardCounts ) == 1:
+        count = shardCounts.pop()
+        merged["missingShards"] = [ i for i in range(count) if i not in shardIndices ]
+
+    merged["completed"].sort( key = str )
+    return merged
+
+def main ( ):
+    args = sys.argv
+    if len(args) < 3 or args[1] != "merge":
+        print( "Usage: Checkpoint.py merge <checkpoint> ... [-o <output>]" )
+        return
+
+    paths = args[2:]
+    output = None
+    if "-o" in paths:
+        at = paths.index( "-o" )
+        if at + 1 >= len(paths):
+            print( "[ERROR] -o needs an output path" )
+            return
+        output = paths[at + 1]
+        paths = paths[:at] + paths[at + 2:]
+
+    try:
+        merged = merge( paths )
+    except (ValueError, KeyError, OSError) as e:
+        print( "[ERROR] Failed to merge checkpoints: " + str(e) )
+        return
+
+    if output != None:
+        with open( output, "w" ) as f:
+            json.dump( merged, f )
+
+    stats = merged["stats"]
+    print( "Shards: " + str(len(merged["shards"])) + ( "" if merged["finished"] else " (some unfinished)" ) )
+    if merged["missingShards"]:
+        print( "Missing Shards: " + ", ".join( str(i) for i in merged["missingShards"] ) )
+    print( "Boards Run: " + str(stats["boards"]) )
+    print( "Solutions Found: " + str(stats["solutions"]) )
+    print( "Trail Pushes: " + str(stats["pushes"]) )
+    print( "Backtracks: " + str(stats["backtracks"]) )
+    if stats["conflicts"] or stats["propagations"]:
+        print( "Conflicts: " + str(stats["conflicts"]) )
+        print( "Propagations: " + str(stats["propagations"]) )
+
+if __name__ == "__main__":
+    main()
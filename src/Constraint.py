@@ -13,6 +13,8 @@ class Constraint:
 
     def __init__ ( self ):
         self.vars = []
+        # Failure weight for dom/wdeg: 1 plus the wipeouts this constraint caused
+        self.weight = 1
 
     # ==================================================================
     # Modifiers
@@ -1,7 +1,78 @@
 import Variable
 import Constraint
 import SudokuBoard
-from math import floor
+from operator import itemgetter
+import threading
+
+"""
+    Geometry of a p x q Sudoku network, independent of any givens. Cells are
+    stored in row-major order and described by (row, col, block); units and
+    neighbor lists refer to cells by index. Templates are built once per
+    geometry and shared by every ConstraintNetwork of that geometry.
+"""
+class NetworkTemplate:
+
+    def __init__ ( self, p, q ):
+        self.p = p
+        self.q = q
+        self.N = p*q
+        N = self.N
+
+        self.cells = []
+        for i in range(N):
+            for j in range(N):
+                self.cells.append( (i, j, (i // p) * p + j // q) )
+
+        # Units are ordered rows, then columns, then blocks
+        self.units = [ [] for u in range(3*N) ]
+        self.unitsOf = []
+        for k, (i, j, block) in enumerate(self.cells):
+            self.units[i].append( k )
+            self.units[N + j].append( k )
+            self.units[2*N + block].append( k )
+            self.unitsOf.append( (i, N + j, 2*N + block) )
+
+        self.neighbors = []
+        for k, (row, col, block) in enumerate(self.unitsOf):
+            cellNeighbors = set( self.units[row] ).union( self.units[col], self.units[block] )
+            cellNeighbors.discard( k )
+            self.neighbors.append( sorted( cellNeighbors ) )
+
+        # Pick a cell's neighbors or units out of a network's lists in one call
+        self.neighborGetters = [ tupleGetter( cellNeighbors ) for cellNeighbors in self.neighbors ]
+        self.unitGetters = [ tupleGetter( cellUnits ) for cellUnits in self.unitsOf ]
+
+        self.values = list(range(1, N + 1))
+
+    # Returns a fresh domain list for a cell holding value (0 for empty)
+    def initialDomain ( self, value ):
+        if value == 0:
+            return self.values[:]
+        return [value]
+
+# Returns a function picking the given indices out of a list as a tuple
+def tupleGetter ( indices ):
+    if len( indices ) > 1:
+        return itemgetter( *indices )
+    return lambda seq: tuple( seq[k] for k in indices )
+
+networkTemplates = dict()
+networkTemplatesLock = threading.Lock()
+
+"""
+    Returns the cached template for the p x q geometry, building it on first
+    use. Templates are read-only once built, so threads share them freely;
+    the lock only keeps two threads from building the same one.
+"""
+def getNetworkTemplate ( p, q ):
+    template = networkTemplates.get( (p, q) )
+    if template == None:
+        with networkTemplatesLock:
+            template = networkTemplates.get( (p, q) )
+            if template == None:
+                template = NetworkTemplate( p, q )
+                networkTemplates[(p, q)] = template
+    return template
 
 """
     CSP representation of the problem. Contains the variables, constraints, and
@@ -16,67 +87,43 @@ class ConstraintNetwork:
     def __init__ ( self, sboard = None ):
         self.constraints = []
         self.variables = []
+        self.template = None
+        self.neighbors = []
+        self.constraintsOf = []
 
         if sboard != None:
+            self.template = getNetworkTemplate( sboard.p, sboard.q )
+            template = self.template
             board = sboard.board
-            temp = []
-            value = 0
-
-            for i in range(sboard.N):
-                for j in range(sboard.N):
-                    value = board[i][j]
-                    domain = []
-                    if value == 0:
-                        d = 1
-                        while d <= sboard.N:
-                            domain.append(d)
-                            d += 1
-                    else:
-                        domain.append(value)
-
-                    block = int(((floor(i/sboard.p) * sboard.p) + floor(j/sboard.q)))
-                    temp.append(Variable.Variable(domain,i,j,block))
-
-            rows = dict()
-            cols = dict()
-            blocks = dict()
-
-            for v in temp:
-                row = v.row
-                col = v.col
-                block = v.block
-
-                if not (row in rows.keys()):
-                    rows[row] = []
-                if not (col in cols.keys()):
-                    cols[col] = []
-                if not (block in blocks.keys()):
-                    blocks[block] = []
-
-                rows[row].append(v)
-                cols[col].append(v)
-                blocks[block].append(v)
-
-            for v in temp:
-                self.addVariable(v)
-
-            for e in rows:
-                c = Constraint.Constraint()
-                for v in rows[e]:
-                    c.addVariable(v)
-                self.addConstraint(c)
 
-            for e in cols:
-                c = Constraint.Constraint()
-                for v in cols[e]:
-                    c.addVariable(v)
-                self.addConstraint(c)
+            for k, (i, j, block) in enumerate(template.cells):
+                self.variables.append( Variable.Variable( template.initialDomain( board[i][j] ), i, j, block, "v" + str(k + 1) ) )
 
-            for e in blocks:
+            for unit in template.units:
                 c = Constraint.Constraint()
-                for v in blocks[e]:
-                    c.addVariable(v)
-                self.addConstraint(c)
+                c.vars = [ self.variables[k] for k in unit ]
+                self.constraints.append( c )
+
+            # Neighbor lists are filled in on first use
+            self.neighbors = [ None ] * len( self.variables )
+            self.constraintsOf = [ getter( self.constraints ) for getter in template.unitGetters ]
+
+    """
+        Writes the givens of a new board of the same geometry into the
+        existing variables, so the topology (variables, constraints and
+        neighbor lists) is reused instead of rebuilt.
+    """
+    def reset ( self, sboard ):
+        template = self.template
+        board = sboard.board
+        for v in self.variables:
+            v.reset( template.initialDomain( board[v.row][v.col] ) )
+        for c in self.constraints:
+            c.weight = 1
+
+    # Returns true if sboard can be loaded with reset() instead of rebuilding
+    def hasGeometry ( self, sboard ):
+        return self.template != None and self.template.p == sboard.p and self.template.q == sboard.q
 
     # ==================================================================
     # Modifiers
@@ -102,6 +149,14 @@ class ConstraintNetwork:
 
     # Returns all variables that share a constraint with v
     def getNeighborsOfVariable ( self, v ):
+        if self.template != None:
+            k = v.row * self.template.N + v.col
+            neighbors = self.neighbors[k]
+            if neighbors == None:
+                neighbors = self.template.neighborGetters[k]( self.variables )
+                self.neighbors[k] = neighbors
+            return neighbors
+
         neighbors = set()
 
         for c in self.constraints:
@@ -126,6 +181,9 @@ class ConstraintNetwork:
             @param v variable to check
             @return list of constraints that contains v
         """
+        if self.template != None:
+            return self.constraintsOf[v.row * self.template.N + v.col]
+
         outList = []
         for c in self.constraints:
             if c.contains( v ):
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+import mmap
+import os
+import struct
+import sys
+import SudokuBoard
+
+"""
+    Packed binary puzzle corpus.
+
+    Layout (little-endian header, 24 bytes):
+        magic    4s   b"SDKC"
+        version  B    1
+        bits     B    bits per cell
+        p        H
+        q        H
+        reserved 6x
+        count    Q    number of puzzles
+
+    followed by count fixed-size records. A record holds the N*N cells in
+    row-major order, each packed into `bits` bits (the fewest that hold
+    0..N: 4 for 9x9, 5 for 16x16 and 25x25, 6 for 36x36 and 49x49), most
+    significant bit first, padded with zero bits to a whole byte.
+"""
+
+MAGIC = b"SDKC"
+VERSION = 1
+HEADER = struct.Struct( "<4sBBHH6xQ" )
+
+# Returns the number of bits needed to store a cell of an N x N board
+def bitsPerCell ( N ):
+    return N.bit_length()
+
+# Returns true if the file starts with the corpus magic number
+def isCorpus ( path ):
+    try:
+        with open( path, "rb" ) as f:
+            return f.read( len(MAGIC) ) == MAGIC
+    except OSError:
+        return False
+
+# ==================================================================
+# Writer
+# ==================================================================
+
+class CorpusWriter:
+
+    def __init__ ( self, path, p, q ):
+        self.p = p
+        self.q = q
+        self.N = p*q
+        self.bits = bitsPerCell( self.N )
+        self.recordSize = (self.N * self.N * self.bits + 7) // 8
+        self.count = 0
+        self.cellFormat = "0" + str(self.bits) + "b"
+        self.file = open( path, "wb" )
+        self.writeHeader()
+
+    def writeHeader ( self ):
+        self.file.seek( 0 )
+        self.file.write( HEADER.pack( MAGIC, VERSION, self.bits, self.p, self.q, self.count ) )
+
+    # Appends a SudokuBoard, which must have the corpus geometry and cells
+    # in 0..N; anything else would spill into the neighboring cells' bits
+    def append ( self, sboard ):
+        if sboard.p != self.p or sboard.q != self.q:
+            raise ValueError( "Board is " + str(sboard.p) + "x" + str(sboard.q) + ", corpus is " + str(self.p) + "x" + str(self.q) )
+        sboard.validate()
+
+        cellFormat = self.cellFormat
+        bitString = "".join( format( value, cellFormat ) for row in sboard.board for value in row )
+        packed = int( bitString, 2 ) << (self.recordSize * 8 - len(bitString))
+        self.file.write( packed.to_bytes( self.recordSize, "big" ) )
+        self.count += 1
+
+    def close ( self ):
+        self.writeHeader()
+        self.file.close()
+
+    def __enter__ ( self ):
+        return self
+
+    def __exit__ ( self, *exc ):
+        self.close()
+
+# ==================================================================
+# Reader
+# ==================================================================
+
+"""
+    Memory-maps a corpus file and decodes puzzles on demand, so only the
+    records actually requested are read from disk.
+"""
+class CorpusReader:
+
+    def __init__ ( self, path ):
+        self.file = open( path, "rb" )
+        try:
+            self.data = mmap.mmap( self.file.fileno(), 0, access = mmap.ACCESS_READ )
+        except ValueError:
+            self.file.close()
+            raise ValueError( "Corpus file is empty: " + path )
+
+        if len(self.data) < HEADER.size:
+            self.close()
+            raise ValueError( "Corpus file is truncated: " + path )
+
+        magic, version, self.bits, self.p, self.q, self.count = HEADER.unpack_from( self.data, 0 )
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError( "Not a version " + str(VERSION) + " puzzle corpus: " + path )
+
+        self.N = self.p * self.q
+        self.cells = self.N * self.N
+        self.recordSize = (self.cells * self.bits + 7) // 8
+        if len(self.data) < HEADER.size + self.count * self.recordSize:
+            self.close()
+            raise ValueError( "Corpus file is truncated: " + path )
+
+    def __len__ ( self ):
+        return self.count
+
+    # Returns the cells of puzzle i as a list of N rows
+    def getRows ( self, i ):
+        if i < 0 or i >= self.count:
+            raise IndexError( "Puzzle index out of range: " + str(i) )
+
+        start = HEADER.size + i * self.recordSize
+        record = self.data[start:start + self.recordSize]
+        N = self.N
+        bits = self.bits
+
+        if bits == 4:
+            # One hex digit per cell
+            digits = record.hex()
+            cells = [ int( digits[k], 16 ) for k in range(self.cells) ]
+        else:
+            bitString = format( int.from_bytes( record, "big" ), "0" + str(self.recordSize * 8) + "b" )
+            cells = [ int( bitString[k:k + bits], 2 ) for k in range(0, self.cells * bits, bits) ]
+
+        return [ cells[r*N:(r + 1)*N] for r in range(N) ]
+
+    # Returns puzzle i as a SudokuBoard
+    def getBoard ( self, i ):
+        board = SudokuBoard.SudokuBoard( self.p, self.q, board = self.getRows( i ) )
+        board.validate()
+        return board
+
+    def __getitem__ ( self, i ):
+        return self.getBoard( i )
+
+    def __iter__ ( self ):
+        for i in range(self.count):
+            yield self.getBoard( i )
+
+    def close ( self ):
+        self.data.close()
+        self.file.close()
+
+    def __enter__ ( self ):
+        return self
+
+    def __exit__ ( self, *exc ):
+        self.close()
+
+# ==================================================================
+# Conversion
+# ==================================================================
+
+"""
+    Converts a board file, or every board file in a directory (in name
+    order), into a corpus. All boards must share one geometry. Returns the
+    number of puzzles written.
+"""
+def convert ( source, target ):
+    if os.path.isdir( source ):
+        paths = [ os.path.join( source, f ) for f in sorted( os.listdir( source ) ) ]
+        paths = [ path for path in paths if os.path.isfile( path ) ]
+    else:
+        paths = [ source ]
+
+    if not paths:
+        raise ValueError( "No board files in " + source )
+
+    writer = None
+    try:
+        for path in paths:
+            sboard = SudokuBoard.SudokuBoard( filepath = path )
+            if writer == None:
+                writer = CorpusWriter( target, sboard.p, sboard.q )
+            writer.append( sboard )
+    except ValueError as e:
+        # Don't leave a partial corpus behind
+        if writer != None:
+            writer.close()
+            os.remove( target )
+        raise ValueError( path + ": " + str(e) )
+
+    writer.close()
+    return writer.count
+
+def main ( ):
+    args = sys.argv
+    if len(args) != 3:
+        print( "Usage: Corpus.py <board file or directory> <output corpus>" )
+        return
+
+    try:
+        count = convert( args[1], args[2] )
+    except ValueError as e:
+        print( "[ERROR] " + str(e) )
+        return
+
+    print( "Wrote " + str(count) + " puzzles to " + args[2] )
+
+if __name__ == "__main__":
+    main()
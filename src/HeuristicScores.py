@@ -0,0 +1,92 @@
+"""
+    Keeps heuristic scores for a ConstraintNetwork up to date as domains
+    change, so value ordering and tie-breaking are lookups instead of
+    neighbor scans:
+
+        degree[k]         number of unassigned peers of cell k
+        support[k][val]   number of peers of cell k whose domain contains val
+
+    Cells are indexed in row-major order as in the network template. The
+    scores are attached to every variable as its listener; trail undo goes
+    through the same setDomain/unassign calls, so it restores them as well.
+"""
+
+class HeuristicScores:
+
+    # ==================================================================
+    # Constructors
+    # ==================================================================
+
+    def __init__ ( self, network ):
+        self.network = network
+        self.rebuild()
+
+    # Recomputes all scores from the current domains and attaches listeners
+    def rebuild ( self ):
+        template = self.network.template
+        variables = self.network.getVariables()
+
+        self.N = template.N
+        self.peers = template.neighbors
+        self.degree = []
+        self.support = []
+
+        for k, v in enumerate( variables ):
+            degree = 0
+            support = [ 0 for i in range(self.N + 1) ]
+            for peer in self.peers[k]:
+                peerVar = variables[peer]
+                if not peerVar.isAssigned():
+                    degree += 1
+                for val in peerVar.getValues():
+                    support[val] += 1
+            self.degree.append( degree )
+            self.support.append( support )
+            v.setListener( self )
+
+    # Stops receiving updates from the network's variables
+    def detach ( self ):
+        for v in self.network.getVariables():
+            v.setListener( None )
+
+    # ==================================================================
+    # Accessors
+    # ==================================================================
+
+    def indexOf ( self, v ):
+        return v.row * self.N + v.col
+
+    def getDegree ( self, v ):
+        return self.degree[ self.indexOf( v ) ]
+
+    def getSupport ( self, v, val ):
+        return self.support[ self.indexOf( v ) ][ val ]
+
+    # ==================================================================
+    # Variable Listener
+    # ==================================================================
+
+    def valueRemoved ( self, v, val ):
+        support = self.support
+        for peer in self.peers[ self.indexOf( v ) ]:
+            support[peer][val] -= 1
+
+    def domainReplaced ( self, v, oldValues, newValues ):
+        support = self.support
+        peers = self.peers[ self.indexOf( v ) ]
+        old = set( oldValues )
+        new = set( newValues )
+
+        for val in old - new:
+            for peer in peers:
+                support[peer][val] -= 1
+
+        for val in new - old:
+            for peer in peers:
+                support[peer][val] += 1
+
+    def assignmentChanged ( self, v, assigned ):
+        delta = -1 if assigned else 1
+        degree = self.degree
+        for peer in self.peers[ self.indexOf( v ) ]:
+            degree[peer] += delta
@@ -0,0 +1,109 @@
+"""
+    Lazy next-step deductions for hints.
+
+    deductions() walks a ConstraintNetwork without changing it and yields
+    one Deduction at a time, cheapest technique first:
+        elimination   an assigned cell's value is removed from a peer's
+                      candidates (the forward checking step)
+        nakedSingle   a cell has one candidate left (Norvig's first rule)
+        hiddenSingle  a value fits only one cell of a unit (Norvig's
+                      second rule)
+
+    Candidates are the cell's domain minus its assigned peers' values, so
+    eliminations forward checking has not applied yet still count. Work is
+    done only as the caller pulls, so taking the first hint of a technique
+    costs a single scan.
+"""
+
+TECHNIQUES = [ "elimination", "nakedSingle", "hiddenSingle" ]
+UNIT_KINDS = [ "row", "col", "block" ]
+
+class Deduction:
+
+    def __init__ ( self, technique, row, col, value, unit ):
+        self.technique = technique
+        self.row = row
+        self.col = col
+        self.value = value
+        # (kind, index) of the unit responsible, e.g. ("block", 4); a naked
+        # single has no single responsible unit and reports its row
+        self.unit = unit
+
+    # Returns true if the deduction places value, false if it eliminates it
+    def isPlacement ( self ):
+        return self.technique != "elimination"
+
+    def __str__ ( self ):
+        action = "place " if self.isPlacement() else "eliminate "
+        return self.technique + ": " + action + str(self.value) + " at r" + str(self.row + 1) + "c" + str(self.col + 1) \
+               + " (" + self.unit[0] + " " + str(self.unit[1] + 1) + ")"
+
+# Returns (kind, index) for a template unit index
+def unitName ( template, u ):
+    return ( UNIT_KINDS[u // template.N], u % template.N )
+
+"""
+    Yields the deductions available in network, in the order of
+    techniques. Stops at the first wipeout, since an inconsistent board has
+    no meaningful next step.
+"""
+def deductions ( network, techniques = TECHNIQUES ):
+    template = network.template
+    variables = network.variables
+    candidates = dict()
+
+    if any( v.size() == 0 for v in variables ):
+        return
+
+    # Candidates of cell k after removing its assigned peers' values
+    def candidatesOf ( k ):
+        if k not in candidates:
+            values = variables[k].getValues()
+            if not variables[k].isAssigned():
+                taken = set( variables[n].getAssignment() for n in template.neighbors[k] if variables[n].isAssigned() )
+                values = [ value for value in values if value not in taken ]
+            candidates[k] = values
+        return candidates[k]
+
+    for technique in techniques:
+        if technique == "elimination":
+            for k, v in enumerate( variables ):
+                if v.isAssigned():
+                    continue
+                domain = v.getDomain()
+                for n in template.neighbors[k]:
+                    peer = variables[n]
+                    if peer.isAssigned() and domain.contains( peer.getAssignment() ):
+                        shared = set( template.unitsOf[k] ).intersection( template.unitsOf[n] )
+                        yield Deduction( technique, v.row, v.col, peer.getAssignment(), unitName( template, min( shared ) ) )
+
+        elif technique == "nakedSingle":
+            for k, v in enumerate( variables ):
+                if v.isAssigned():
+                    continue
+                values = candidatesOf( k )
+                if len( values ) == 0:
+                    return
+                if len( values ) == 1:
+                    yield Deduction( technique, v.row, v.col, values[0], unitName( template, template.unitsOf[k][0] ) )
+
+        elif technique == "hiddenSingle":
+            for u, unit in enumerate( template.units ):
+                places = dict()
+                for k in unit:
+                    for value in candidatesOf( k ):
+                        places.setdefault( value, [] ).append( k )
+                if len( places ) < template.N:
+                    return
+                for value in template.values:
+                    cells = places[value]
+                    if len( cells ) == 1 and not variables[cells[0]].isAssigned():
+                        v = variables[cells[0]]
+                        yield Deduction( technique, v.row, v.col, value, unitName( template, u ) )
+
+        else:
+            raise ValueError( "Unknown technique " + technique )
+
+# Returns the first deduction of the cheapest technique that has one, or None
+def nextHint ( network, techniques = TECHNIQUES ):
+    return next( deductions( network, techniques ), None )
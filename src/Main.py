@@ -8,6 +8,14 @@ import Constraint
 import ConstraintNetwork
 import BTSolver
 import Trail
+import Corpus
+import Checkpoint
+import SearchTrace
+import MemoryProfile
+import contextlib
+import collections
+import concurrent.futures
+import threading
 import time
 
 """
@@ -15,6 +23,146 @@ import time
     command line and properly starting the backtrack solver.
 """
 
+# Probes per search node for SAC unless --probes says otherwise
+DEFAULT_PROBE_BUDGET = 16
+
+# Returns a context manager measuring a solver phase, or a no-op one
+def phase ( profiler, name ):
+    if profiler == None:
+        return contextlib.nullcontext()
+    return profiler.phase( name )
+
+"""
+    Solves one board and returns (solver, stats), where stats holds the
+    board's counts for Checkpoint.STAT_KEYS. Pass the solver returned by a
+    previous call to reuse it; each thread must use its own trail and solver.
+"""
+def solveBoard ( sudokudata, trail, val_sh = "", var_sh = "", cc = "", engine = "", nogoodSize = 0, solver = None, recorder = None, profiler = None, probeBudget = 0 ):
+    pushes = trail.getPushCount()
+    undos = trail.getUndoCount()
+
+    with phase( profiler, "construction" ):
+        if solver == None:
+            solver = BTSolver.BTSolver( sudokudata, trail, val_sh, var_sh, cc, engine, nogoodSize, probeBudget )
+            solver.setTraceRecorder( recorder )
+        else:
+            solver.reset( sudokudata )
+    with phase( profiler, "propagation" ):
+        if cc in ["forwardChecking","norvigCheck","tournCC"]:
+            solver.checkConsistency()
+    with phase( profiler, "search" ):
+        solver.solve()
+
+    stats = {
+        "boards"     : 1,
+        "solutions"  : 1 if solver.hassolution else 0,
+        "pushes"     : trail.getPushCount() - pushes,
+        "backtracks" : trail.getUndoCount() - undos,
+    }
+    if solver.satStats != None:
+        stats["conflicts"] = solver.satStats["conflicts"]
+        stats["propagations"] = solver.satStats["propagations"]
+    return ( solver, stats )
+
+"""
+    Solves every board in names, loading each with load(name), and prints
+    the aggregate statistics. Only boards in the shard are run; with a
+    checkpoint, boards it already lists are skipped and its totals are
+    included. With threads > 1 the boards are solved by a thread pool, each
+    thread reusing its own trail and solver; results are still reported
+    and checkpointed in order, from this thread.
+"""
+def solveBoards ( names, load, trail, val_sh, var_sh, cc, engine, nogoodSize, shard = (0, 1), checkpoint = None, recorder = None, profiler = None, threads = 1, probeBudget = 0 ):
+    totals = dict( (key, 0) for key in Checkpoint.STAT_KEYS )
+    if checkpoint != None:
+        totals.update( checkpoint.stats )
+
+    local = threading.local()
+    local.trail = trail
+    local.solver = None
+
+    # Returns (name, stats), with stats None and an error for a malformed board
+    def work ( f ):
+        try:
+            sudokudata = load( f )
+        except ValueError as e:
+            return ( f, None, str(e) )
+
+        if not hasattr( local, "trail" ):
+            local.trail = Trail.Trail()
+            local.solver = None
+        local.solver, stats = solveBoard( sudokudata, local.trail, val_sh, var_sh, cc, engine, nogoodSize,
+                                          local.solver, recorder, profiler, probeBudget )
+        return ( f, stats, None )
+
+    pending = ( f for f in names if Checkpoint.inShard( f, shard ) and ( checkpoint == None or not checkpoint.isDone( f ) ) )
+
+    # Announces a board before solving it, so a slow board shows which it is
+    def announcedWork ( f ):
+        print ( "Running board: " + str(f) )
+        return work( f )
+
+    executor = None
+    if threads <= 1:
+        results = map( announcedWork, pending )
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor( threads )
+        results = mapBounded( executor, work, pending, 4 * threads )
+
+    try:
+        for f, stats, error in results:
+            if executor != None:
+                print ( "Running board: " + str(f) )
+            if stats == None:
+                print ( "[ERROR] Skipping malformed board: " + error )
+                if checkpoint != None:
+                    checkpoint.record( f, {} )
+                continue
+
+            for key in stats:
+                totals[key] += stats[key]
+            if checkpoint != None:
+                checkpoint.record( f, stats )
+    finally:
+        if executor != None:
+            executor.shutdown( cancel_futures = True )
+
+    if checkpoint != None:
+        checkpoint.finish()
+
+    print ( "Solutions Found: " + str(totals["solutions"]) )
+    print ( "Trail Pushes: " + str(totals["pushes"]) )
+    print ( "Backtracks: "  + str(totals["backtracks"]) )
+    if engine == "cdclSAT":
+        print ( "Conflicts: " + str(totals["conflicts"]) )
+        print ( "Propagations: " + str(totals["propagations"]) )
+
+# Like executor.map, but keeps at most window items in flight, so large
+# corpora are not queued all at once
+def mapBounded ( executor, fn, items, window ):
+    futures = collections.deque()
+    for item in items:
+        futures.append( executor.submit( fn, item ) )
+        if len( futures ) >= window:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+# Opens the checkpoint at path for a batch run, or returns None
+def openCheckpoint ( path, source, shard, config ):
+    if path == None:
+        return None
+
+    try:
+        checkpoint = Checkpoint.Checkpoint( path, source, shard, config )
+    except (ValueError, KeyError, OSError) as e:
+        print ( "[ERROR] Failed to open checkpoint: " + str(e) )
+        return None
+
+    if checkpoint.completed:
+        print ( "Resuming from checkpoint: " + str(len(checkpoint.completed)) + " boards done" )
+    return checkpoint
+
 def main ( ):
     args = sys.argv
 
@@ -23,14 +171,60 @@ def main ( ):
     var_sh = "";
     val_sh = "";
     cc     = "";
+    engine = "";
+    nogoodSize = 0;
+    shard  = (0, 1);
+    checkpointPath = None;
+    tracePath = None;
+    profiler = None;
+    threads = 1;
+    probeBudget = 0;
+
+    i = 1
+    while i < len(args):
+        arg = args[i]
+        i += 1
+
+        if arg in ["--shard", "--checkpoint", "--trace", "--threads", "--probes"]:
+            if i >= len(args):
+                print ( "[ERROR] " + arg + " needs a value." )
+                return
+            value = args[i]
+            i += 1
 
-    for arg in [args[i] for i in range(1, len(args))]:
-        if arg == "MRV":
+            if arg == "--checkpoint":
+                checkpointPath = value
+            elif arg == "--trace":
+                tracePath = value
+            elif arg == "--threads":
+                if not value.isdigit() or int(value) < 1:
+                    print ( "[ERROR] --threads needs a positive number." )
+                    return
+                threads = int(value)
+            elif arg == "--probes":
+                if not value.isdigit():
+                    print ( "[ERROR] --probes needs a number." )
+                    return
+                probeBudget = int(value)
+            else:
+                try:
+                    shard = Checkpoint.parseShard( value )
+                except ValueError as e:
+                    print ( "[ERROR] " + str(e) )
+                    return
+
+        elif arg == "--memory":
+            profiler = MemoryProfile.MemoryProfiler()
+
+        elif arg == "MRV":
             var_sh = "MinimumRemainingValue"
 
         elif arg == "MAD":
             var_sh = "MRVwithTieBreaker"
 
+        elif arg == "WDEG":
+            var_sh = "domOverWdeg"
+
         elif arg == "LCV":
             val_sh = "LeastConstrainingValue"
 
@@ -40,6 +234,20 @@ def main ( ):
         elif arg == "NOR":
             cc = "norvigCheck"
 
+        elif arg == "CBJ":
+            engine = "conflictDirectedBackjumping"
+
+        elif arg == "NOGOOD":
+            engine = "conflictDirectedBackjumping"
+            nogoodSize = 3
+
+        elif arg == "SAT":
+            engine = "cdclSAT"
+
+        elif arg == "SAC":
+            if probeBudget == 0:
+                probeBudget = DEFAULT_PROBE_BUDGET
+
         elif arg == "TOURN":
             var_sh = "tournVar"
             val_sh = "tournVal"
@@ -48,24 +256,48 @@ def main ( ):
         else:
             file = arg;
 
+    if threads > 1 and ( tracePath != None or profiler != None ):
+        print ( "[ERROR] --trace and --memory need a single thread." )
+        return
+
     trail = Trail.Trail();
 
+    recorder = None
+    if tracePath != None:
+        recorder = SearchTrace.TraceRecorder( tracePath, { "var" : var_sh, "val" : val_sh, "cc" : cc, "engine" : engine } )
+
+    try:
+        run( file, trail, val_sh, var_sh, cc, engine, nogoodSize, shard, checkpointPath, recorder, profiler, threads, probeBudget )
+    finally:
+        if recorder != None:
+            recorder.close()
+
+    if profiler != None:
+        print( profiler.report() )
+        profiler.stop()
+
+# Solves the random board, corpus, directory or board file named by file
+def run ( file, trail, val_sh, var_sh, cc, engine, nogoodSize, shard, checkpointPath, recorder, profiler, threads = 1, probeBudget = 0 ):
     if file == "":
         sudokudata = SudokuBoard.SudokuBoard( 3, 3, 7 )
         print(sudokudata)
 
-        solver = BTSolver.BTSolver( sudokudata, trail, val_sh, var_sh, cc )
-        if cc in ["forwardChecking","norvigCheck","tournCC"]:
-            solver.checkConsistency()
-        solver.solve()
+        printSolution( solveBoard( sudokudata, trail, val_sh, var_sh, cc, engine, nogoodSize, None, recorder, profiler, probeBudget )[0], trail )
+        return
 
-        if solver.hassolution:
-            print( solver.getSolution() )
-            print( "Trail Pushes: " + str(trail.getPushCount()) )
-            print( "Backtracks: " + str(trail.getUndoCount()) )
+    if Corpus.isCorpus(file):
+        try:
+            corpus = Corpus.CorpusReader( file )
+        except ValueError as e:
+            print ( "[ERROR] " + str(e) )
+            return
 
-        else:
-            print( "Failed to find a solution" )
+        with corpus:
+            checkpoint = openCheckpoint( checkpointPath, file, shard, [var_sh, val_sh, cc, engine, nogoodSize, probeBudget] )
+            if checkpointPath != None and checkpoint == None:
+                return
+            solveBoards( range(len(corpus)), corpus.getBoard, trail, val_sh, var_sh, cc, engine, nogoodSize,
+                         shard, checkpoint, recorder, profiler, threads, probeBudget )
 
         return
 
@@ -78,39 +310,38 @@ def main ( ):
             print ( "[ERROR] Failed to open directory." )
             return
 
-        numSolutions = 0
-        for f in listOfBoards:
-            print ( "Running board: " + str(f) )
-            sudokudata = SudokuBoard.SudokuBoard( filepath=os.path.join( file, f ) )
-
-            solver = BTSolver.BTSolver( sudokudata, trail, val_sh, var_sh, cc )
-            if cc in ["forwardChecking","norvigCheck","tournCC"]:
-                solver.checkConsistency()
-            solver.solve()
-
-            if solver.hassolution:
-                numSolutions += 1;
-
-        print ( "Solutions Found: " + str(numSolutions) )
-        print ( "Trail Pushes: " + str(trail.getPushCount()) )
-        print ( "Backtracks: "  + str(trail.getUndoCount()) )
+        checkpoint = openCheckpoint( checkpointPath, file, shard, [var_sh, val_sh, cc, engine, nogoodSize, probeBudget] )
+        if checkpointPath != None and checkpoint == None:
+            return
+        solveBoards( sorted( listOfBoards ), lambda f: SudokuBoard.SudokuBoard( filepath=os.path.join( file, f ) ),
+                     trail, val_sh, var_sh, cc, engine, nogoodSize, shard, checkpoint, recorder, profiler, threads, probeBudget )
 
         return
 
-    sudokudata =  SudokuBoard.SudokuBoard( filepath=os.path.abspath( file ) )
+    try:
+        sudokudata =  SudokuBoard.SudokuBoard( filepath=os.path.abspath( file ) )
+    except ValueError as e:
+        print ( "[ERROR] Malformed board: " + str(e) )
+        return
     print(sudokudata)
 
-    solver = BTSolver.BTSolver( sudokudata, trail, val_sh, var_sh, cc )
-    if cc in ["forwardChecking","norvigCheck","tournCC"]:
-        solver.checkConsistency()
-    solver.solve()
+    printSolution( solveBoard( sudokudata, trail, val_sh, var_sh, cc, engine, nogoodSize, None, recorder, profiler, probeBudget )[0], trail )
 
+# Prints a single board's solution and counts
+def printSolution ( solver, trail ):
     if solver.hassolution:
         print( solver.getSolution() )
         print( "Trail Pushes: " + str(trail.getPushCount()) )
         print( "Backtracks: " + str(trail.getUndoCount()) )
+        if solver.satStats != None:
+            print( "Conflicts: " + str(solver.satStats["conflicts"]) )
+            print( "Propagations: " + str(solver.satStats["propagations"]) )
+        if solver.probeBudget > 0:
+            print( "Probes: " + str(solver.probeStats["probes"]) + " (" + str(solver.probeStats["cached"]) + " cached, "
+                   + str(solver.probeStats["pruned"]) + " pruned)" )
 
     else:
         print( "Failed to find a solution" )
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import contextlib
+import gc
+import os
+import sys
+import tracemalloc
+import Domain
+
+"""
+    Allocation and memory profiling of solver phases.
+
+    Each phase is measured with tracemalloc and the garbage collector's
+    counters:
+        retained     bytes still allocated when the phase ends
+        peak         highest traced memory during the phase, above its start
+        netBlocks    memory blocks still allocated minus those freed
+        collections  garbage collections per generation
+        sites        net retained bytes and blocks per source line
+        domains      Domain objects created, per calling source line
+
+    tracemalloc only sees what is left when the phase ends, so the churn
+    freed inside the phase (a Domain per assignValue, a domain copy per
+    Trail.push) shows up in peak but not per site. Domain creations are
+    therefore counted directly, by wrapping Domain.__init__ while the
+    profiler is running.
+
+    A phase may run many times (e.g. once per board in a batch); the
+    report sums retained memory, creations and collections and keeps the
+    largest peak.
+"""
+
+class MemoryProfiler:
+
+    # ==================================================================
+    # Constructors
+    # ==================================================================
+
+    def __init__ ( self, top = 10 ):
+        self.top = top
+        self.phases = dict()
+        self.order = []
+        self.ignore = [
+            tracemalloc.Filter( False, tracemalloc.__file__ ),
+            tracemalloc.Filter( False, os.path.abspath( __file__ ) ),
+            tracemalloc.Filter( False, contextlib.__file__ ),
+            tracemalloc.Filter( False, "<unknown>" ),
+        ]
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        # Creation counts per (filename, lineno) for the phase being run
+        self.created = None
+        self.domainInit = Domain.Domain.__init__
+        Domain.Domain.__init__ = self.countingInit( self.domainInit )
+
+    def stop ( self ):
+        Domain.Domain.__init__ = self.domainInit
+        tracemalloc.stop()
+
+    # Returns a Domain.__init__ that also counts the call at its caller's line
+    def countingInit ( self, init ):
+        profiler = self
+
+        def countedInit ( domain, *args ):
+            created = profiler.created
+            if created != None:
+                frame = sys._getframe( 1 )
+                key = ( frame.f_code.co_filename, frame.f_lineno )
+                created[key] = created.get( key, 0 ) + 1
+            init( domain, *args )
+
+        return countedInit
+
+    # ==================================================================
+    # Measurement
+    # ==================================================================
+
+    def getPhase ( self, name ):
+        if name not in self.phases:
+            self.order.append( name )
+            self.phases[name] = {
+                "runs"        : 0,
+                "retained"    : 0,
+                "peak"        : 0,
+                "netBlocks"   : 0,
+                "collections" : [ 0 for s in gc.get_stats() ],
+                "sites"       : dict(),
+                "domains"     : dict(),
+            }
+        return self.phases[name]
+
+    # Context manager measuring the code it wraps as one run of phase name
+    @contextlib.contextmanager
+    def phase ( self, name ):
+        collections = [ s["collections"] for s in gc.get_stats() ]
+        outer = self.created
+        self.created = dict()
+        before = tracemalloc.take_snapshot().filter_traces( self.ignore )
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().filter_traces( self.ignore )
+            created = self.created
+            self.created = outer
+
+            stats = self.getPhase( name )
+            stats["runs"] += 1
+            stats["retained"] += current - start
+            stats["peak"] = max( stats["peak"], peak - start )
+            for generation, s in enumerate( gc.get_stats() ):
+                stats["collections"][generation] += s["collections"] - collections[generation]
+
+            sites = stats["sites"]
+            for diff in after.compare_to( before, "lineno" ):
+                if diff.size_diff == 0 and diff.count_diff == 0:
+                    continue
+                frame = diff.traceback[0]
+                key = ( frame.filename, frame.lineno )
+                size, count = sites.get( key, (0, 0) )
+                sites[key] = ( size + diff.size_diff, count + diff.count_diff )
+                stats["netBlocks"] += diff.count_diff
+
+            domains = stats["domains"]
+            for key, count in created.items():
+                domains[key] = domains.get( key, 0 ) + count
+
+    # ==================================================================
+    # Report
+    # ==================================================================
+
+    def report ( self ):
+        output = "Memory Profile\n"
+        for name in self.order:
+            stats = self.phases[name]
+            output += "\n" + name + " (" + str(stats["runs"]) + " runs)\n"
+            output += "  Retained: " + formatBytes( stats["retained"] ) + "\n"
+            output += "  Peak: " + formatBytes( stats["peak"] ) + "\n"
+            output += "  Net Blocks: " + str(stats["netBlocks"]) + "\n"
+            output += "  GC Collections: " + " / ".join( str(c) for c in stats["collections"] ) + "\n"
+
+            domains = sorted( stats["domains"].items(), key = lambda item: -item[1] )
+            output += "  Domains Created: " + str( sum( count for key, count in domains ) ) + "\n"
+            for (filename, lineno), count in domains[:self.top]:
+                output += "    " + os.path.basename( filename ) + ":" + str(lineno) + "  " + str(count) + "\n"
+
+            # Net change per site: negative where the phase freed more than it kept
+            sites = sorted( stats["sites"].items(), key = lambda item: -abs( item[1][0] ) )[:self.top]
+            if sites:
+                output += "  Net Retained by Site:\n"
+            for (filename, lineno), (size, count) in sites:
+                output += "    " + os.path.basename( filename ) + ":" + str(lineno) \
+                          + "  " + formatBytes( size ) + " in " + str(count) + " blocks\n"
+        return output
+
+def formatBytes ( size ):
+    for unit in [ "B", "KiB", "MiB" ]:
+        if abs( size ) < 1024:
+            return "%.1f %s" % (size, unit) if unit != "B" else str(size) + " B"
+        size /= 1024.0
+    return "%.1f GiB" % size
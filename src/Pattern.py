@@ -0,0 +1,145 @@
+import SudokuBoard
+
+"""
+    Direct completion of very sparse boards from a pattern grid.
+
+    Row i of a p x q board lies in band i div p at position i mod p, and
+    column j in stack j div q at position j mod q. With a permutation of the
+    bands and of the rows inside each band, row i gets the offset
+        r(i) = q * (position of its row in the band) + (position of its band)
+    and with a permutation of the stacks and of the columns inside each
+    stack, column j gets
+        c(j) = q * (position of its stack) + (position of its column)
+    The grid (r(i) + c(j)) mod N, with its N digits relabelled, is then a
+    valid solution for any choice of these permutations.
+
+    complete() searches those permutations and the digit relabelling for a
+    choice that agrees with the givens, fixing only the parts the givens
+    touch. With a handful of givens that search takes a few steps, against
+    building and propagating a whole network; when it runs out of budget
+    the caller falls back to search.
+"""
+
+# Boards with at most this many givens per unit of N cells (so at most N
+# givens) are tried
+SPARSE_GIVENS_PER_UNIT = 1
+
+def isSparse ( givens, N ):
+    return givens <= SPARSE_GIVENS_PER_UNIT * N
+
+class PatternFit:
+
+    def __init__ ( self, p, q, givens, budget ):
+        self.p = p
+        self.q = q
+        self.N = p*q
+        self.givens = givens
+        self.budget = budget
+
+        # Partial permutations: key -> position, and positions used per group
+        self.position = dict()
+        self.used = dict()
+        self.digits = dict()
+        self.values = set()
+
+    # Keys of the row and column permutation entries a cell depends on
+    def keysOf ( self, i, j ):
+        band, stack = i // self.p, j // self.q
+        return [ ("band", band), ("row", band, i % self.p), ("stack", stack), ("col", stack, j % self.q) ]
+
+    def groupOf ( self, key ):
+        return key[:-1] if len(key) == 3 else key[0]
+
+    def sizeOf ( self, key ):
+        return self.q if key[0] in ["band", "col"] else self.p
+
+    def digitOf ( self, i, j ):
+        band, stack = i // self.p, j // self.q
+        r = self.q * self.position[("row", band, i % self.p)] + self.position[("band", band)]
+        c = self.q * self.position[("stack", stack)] + self.position[("col", stack, j % self.q)]
+        return (r + c) % self.N
+
+    # Fits givens[g:], returning true on success
+    def fit ( self, g ):
+        if g == len( self.givens ):
+            return True
+        i, j, value = self.givens[g]
+        return self.fitKeys( self.keysOf( i, j ), 0, g )
+
+    def fitKeys ( self, keys, k, g ):
+        self.budget -= 1
+        if self.budget < 0:
+            return False
+
+        if k == len( keys ):
+            i, j, value = self.givens[g]
+            d = self.digitOf( i, j )
+            if d in self.digits:
+                return self.digits[d] == value and self.fit( g + 1 )
+            if value in self.values:
+                return False
+
+            self.digits[d] = value
+            self.values.add( value )
+            if self.fit( g + 1 ):
+                return True
+            del self.digits[d]
+            self.values.discard( value )
+            return False
+
+        key = keys[k]
+        if key in self.position:
+            return self.fitKeys( keys, k + 1, g )
+
+        used = self.used.setdefault( self.groupOf( key ), set() )
+        for position in range( self.sizeOf( key ) ):
+            if position in used:
+                continue
+            self.position[key] = position
+            used.add( position )
+            if self.fitKeys( keys, k + 1, g ):
+                return True
+            del self.position[key]
+            used.discard( position )
+        return False
+
+    # Gives every untouched permutation entry and digit a free value
+    def fill ( self ):
+        for i in range(self.N):
+            for j in range(self.N):
+                for key in self.keysOf( i, j ):
+                    if key not in self.position:
+                        used = self.used.setdefault( self.groupOf( key ), set() )
+                        position = min( set( range( self.sizeOf( key ) ) ) - used )
+                        self.position[key] = position
+                        used.add( position )
+
+        free = [ value for value in range(1, self.N + 1) if value not in self.values ]
+        for d in range(self.N):
+            if d not in self.digits:
+                self.digits[d] = free.pop()
+
+"""
+    Returns a solution grid (lists of rows) agreeing with givens, a list of
+    (row, col, value), or None if no symmetry of the pattern fitting them
+    was found within budget steps.
+"""
+def complete ( p, q, givens, budget = 2000 ):
+    search = PatternFit( p, q, givens, budget )
+    if not search.fit( 0 ):
+        return None
+
+    search.fill()
+    N = p*q
+    return [ [ search.digits[search.digitOf( i, j )] for j in range(N) ] for i in range(N) ]
+
+# Returns a solved SudokuBoard for a sparse network's assignments, or None
+def completeNetwork ( network, p, q ):
+    givens = [ (v.row, v.col, v.getAssignment()) for v in network.getVariables() if v.isAssigned() ]
+    if not isSparse( len( givens ), p*q ):
+        return None
+
+    grid = complete( p, q, givens )
+    if grid == None:
+        return None
+    return SudokuBoard.SudokuBoard( p, q, board = grid )
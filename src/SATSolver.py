@@ -0,0 +1,338 @@
+import heapq
+import time
+
+"""
+    Conflict-driven clause learning SAT solver.
+
+    Variables are numbered 1..numVars and literals are +v / -v. Per-literal
+    arrays are indexed directly by the literal: with 2*numVars + 1 slots,
+    Python's negative indexing puts -v at numVars + 1 .. 2*numVars, so no
+    separate literal encoding is needed.
+
+    Uses two watched literals for unit propagation, first-UIP clause
+    learning, VSIDS branching with phase saving, and Luby restarts.
+"""
+
+class SATSolver:
+
+    # ==================================================================
+    # Constructors
+    # ==================================================================
+
+    def __init__ ( self, numVars, restartBase = 100, varDecay = 0.95 ):
+        self.numVars = numVars
+        self.ok = True
+
+        size = 2*numVars + 1
+        self.clauses = []
+        self.learnts = []
+        self.watches = [ [] for i in range(size) ]
+        self.litValue = [ 0 for i in range(size) ]
+
+        self.level = [ 0 for i in range(numVars + 1) ]
+        self.reason = [ None for i in range(numVars + 1) ]
+        self.seen = [ False for i in range(numVars + 1) ]
+        self.trail = []
+        self.trailLim = []
+        self.qhead = 0
+
+        self.activity = [ 0.0 for i in range(numVars + 1) ]
+        self.varInc = 1.0
+        self.varDecay = varDecay
+        self.phase = [ -1 for i in range(numVars + 1) ]
+        self.order = [ (0.0, v) for v in range(1, numVars + 1) ]
+        self.restartBase = restartBase
+
+        self.conflicts = 0
+        self.propagations = 0
+        self.decisions = 0
+        self.restarts = 0
+
+    # ==================================================================
+    # Clauses
+    # ==================================================================
+
+    # Adds a clause given as a list of literals; must be called before solve
+    def addClause ( self, lits ):
+        if not self.ok:
+            return False
+
+        clause = []
+        for lit in lits:
+            if -lit in clause:
+                return True
+            if lit not in clause:
+                clause.append( lit )
+
+        if len( clause ) == 0:
+            self.ok = False
+        elif len( clause ) == 1:
+            value = self.litValue[clause[0]]
+            if value == -1:
+                self.ok = False
+            elif value == 0:
+                self.enqueue( clause[0], None )
+        else:
+            self.clauses.append( clause )
+            self.watches[clause[0]].append( clause )
+            self.watches[clause[1]].append( clause )
+
+        return self.ok
+
+    # ==================================================================
+    # Assignment
+    # ==================================================================
+
+    def decisionLevel ( self ):
+        return len( self.trailLim )
+
+    def enqueue ( self, lit, reason ):
+        self.litValue[lit] = 1
+        self.litValue[-lit] = -1
+        v = abs( lit )
+        self.level[v] = len( self.trailLim )
+        self.reason[v] = reason
+        self.trail.append( lit )
+
+    # Undoes all assignments above the given decision level
+    def cancelUntil ( self, level ):
+        if len( self.trailLim ) <= level:
+            return
+
+        litValue = self.litValue
+        start = self.trailLim[level]
+        for lit in self.trail[start:]:
+            v = abs( lit )
+            litValue[lit] = 0
+            litValue[-lit] = 0
+            self.reason[v] = None
+            self.phase[v] = 1 if lit > 0 else -1
+            heapq.heappush( self.order, (-self.activity[v], v) )
+
+        del self.trail[start:]
+        del self.trailLim[level:]
+        self.qhead = len( self.trail )
+
+    # ==================================================================
+    # Propagation
+    # ==================================================================
+
+    # Propagates the trail; returns a conflicting clause or None
+    def propagate ( self ):
+        litValue = self.litValue
+        watches = self.watches
+        trail = self.trail
+
+        while self.qhead < len( trail ):
+            p = trail[self.qhead]
+            self.qhead += 1
+            self.propagations += 1
+
+            falseLit = -p
+            watchers = watches[falseLit]
+            kept = []
+            i = 0
+            n = len( watchers )
+            while i < n:
+                clause = watchers[i]
+                i += 1
+
+                # Keep the false literal in position 1
+                if clause[0] == falseLit:
+                    clause[0] = clause[1]
+                    clause[1] = falseLit
+
+                first = clause[0]
+                if litValue[first] == 1:
+                    kept.append( clause )
+                    continue
+
+                # Look for a new literal to watch
+                found = False
+                for k in range(2, len( clause )):
+                    lit = clause[k]
+                    if litValue[lit] != -1:
+                        clause[1] = lit
+                        clause[k] = falseLit
+                        watches[lit].append( clause )
+                        found = True
+                        break
+                if found:
+                    continue
+
+                kept.append( clause )
+                if litValue[first] == -1:
+                    kept.extend( watchers[i:] )
+                    watches[falseLit] = kept
+                    self.qhead = len( trail )
+                    return clause
+
+                self.enqueue( first, clause )
+
+            watches[falseLit] = kept
+
+        return None
+
+    # ==================================================================
+    # Conflict Analysis
+    # ==================================================================
+
+    def bumpVariable ( self, v ):
+        self.activity[v] += self.varInc
+        if self.activity[v] > 1e100:
+            for u in range(1, self.numVars + 1):
+                self.activity[u] *= 1e-100
+            self.varInc *= 1e-100
+            self.rebuildOrder()
+        elif self.litValue[v] == 0:
+            heapq.heappush( self.order, (-self.activity[v], v) )
+
+    def rebuildOrder ( self ):
+        self.order = [ (-self.activity[v], v) for v in range(1, self.numVars + 1) if self.litValue[v] == 0 ]
+        heapq.heapify( self.order )
+
+    """
+        First-UIP analysis. Returns the learnt clause, asserting literal
+        first, and the level to backtrack to.
+    """
+    def analyze ( self, conflict ):
+        seen = self.seen
+        level = self.level
+        currentLevel = len( self.trailLim )
+
+        learnt = [ None ]
+        pathCount = 0
+        p = None
+        index = len( self.trail ) - 1
+        clause = conflict
+
+        while True:
+            start = 0 if p == None else 1
+            for k in range(start, len( clause )):
+                q = clause[k]
+                v = abs( q )
+                if not seen[v] and level[v] > 0:
+                    seen[v] = True
+                    self.bumpVariable( v )
+                    if level[v] >= currentLevel:
+                        pathCount += 1
+                    else:
+                        learnt.append( q )
+
+            while not seen[abs( self.trail[index] )]:
+                index -= 1
+            p = self.trail[index]
+            index -= 1
+            clause = self.reason[abs( p )]
+            seen[abs( p )] = False
+            pathCount -= 1
+            if pathCount == 0:
+                break
+
+        learnt[0] = -p
+        for q in learnt[1:]:
+            seen[abs( q )] = False
+
+        backtrackLevel = 0
+        if len( learnt ) > 1:
+            maxIndex = 1
+            for k in range(2, len( learnt )):
+                if level[abs( learnt[k] )] > level[abs( learnt[maxIndex] )]:
+                    maxIndex = k
+            learnt[1], learnt[maxIndex] = learnt[maxIndex], learnt[1]
+            backtrackLevel = level[abs( learnt[1] )]
+
+        return ( learnt, backtrackLevel )
+
+    # ==================================================================
+    # Search
+    # ==================================================================
+
+    def pickBranchLiteral ( self ):
+        order = self.order
+        litValue = self.litValue
+        while order:
+            v = heapq.heappop( order )[1]
+            if litValue[v] == 0:
+                return v if self.phase[v] > 0 else -v
+        return None
+
+    # Returns True, False, or None once conflictLimit conflicts occur
+    def search ( self, conflictLimit, deadline ):
+        conflictCount = 0
+        while True:
+            conflict = self.propagate()
+            if conflict != None:
+                self.conflicts += 1
+                conflictCount += 1
+                if len( self.trailLim ) == 0:
+                    return False
+
+                learnt, backtrackLevel = self.analyze( conflict )
+                self.cancelUntil( backtrackLevel )
+                if len( learnt ) == 1:
+                    self.enqueue( learnt[0], None )
+                else:
+                    self.learnts.append( learnt )
+                    self.watches[learnt[0]].append( learnt )
+                    self.watches[learnt[1]].append( learnt )
+                    self.enqueue( learnt[0], learnt )
+
+                self.varInc /= self.varDecay
+
+            else:
+                if conflictCount >= conflictLimit:
+                    self.cancelUntil( 0 )
+                    return None
+                if deadline != None and time.time() > deadline:
+                    self.cancelUntil( 0 )
+                    return None
+
+                lit = self.pickBranchLiteral()
+                if lit == None:
+                    return True
+
+                self.decisions += 1
+                self.trailLim.append( len( self.trail ) )
+                self.enqueue( lit, None )
+
+    """
+        Solves the clauses added so far. Returns True if satisfiable, False
+        if not, or None if the deadline (a time.time() value) passed first.
+    """
+    def solve ( self, deadline = None ):
+        if not self.ok:
+            return False
+
+        if self.propagate() != None:
+            self.ok = False
+            return False
+
+        restart = 0
+        while True:
+            result = self.search( self.restartBase * luby( restart ), deadline )
+            if result != None:
+                return result
+            if deadline != None and time.time() > deadline:
+                return None
+            restart += 1
+            self.restarts += 1
+
+    # Returns the value of each variable as a list indexed by variable
+    def getModel ( self ):
+        return [ self.litValue[v] > 0 for v in range(self.numVars + 1) ]
+
+# Returns the i-th element (from 0) of the Luby restart sequence 1 1 2 1 1 2 4 ...
+def luby ( i ):
+    size = 1
+    seq = 0
+    while size < i + 1:
+        seq += 1
+        size = 2*size + 1
+
+    while size - 1 != i:
+        size = (size - 1) >> 1
+        seq -= 1
+        i = i % size
+
+    return 2 ** seq
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+import json
+import struct
+import sys
+import time
+
+"""
+    Compact binary trace of a BTSolver search, and a replay analyzer.
+
+    File layout:
+        header   "<4sBH"  magic b"SDKT", version, length of the config JSON
+        config   JSON with the solver's heuristics
+        events   "<BHIHQ" type, depth, cell, value, nanoseconds since start
+
+    Cells are row-major indices. Event types:
+        BOARD      a new board starts; cell = p, value = q
+        DECIDE     search assigns value to cell
+        ASSIGN     propagation assigns value to cell
+        REMOVE     propagation removes value from cell's domain
+        PROPAGATE  a consistency check fires; value = PROPAGATORS index
+        UNDO       the trail backtracks to depth
+
+    Events are packed into an in-memory buffer and written in large chunks.
+"""
+
+MAGIC = b"SDKT"
+VERSION = 1
+HEADER = struct.Struct( "<4sBH" )
+EVENT = struct.Struct( "<BHIHQ" )
+
+BOARD     = 0
+DECIDE    = 1
+ASSIGN    = 2
+REMOVE    = 3
+PROPAGATE = 4
+UNDO      = 5
+
+EVENT_NAMES = [ "board", "decide", "assign", "remove", "propagate", "undo" ]
+PROPAGATORS = [ "assignmentsCheck", "forwardChecking", "norvigCheck", "explainedForwardCheck" ]
+
+# ==================================================================
+# Recorder
+# ==================================================================
+
+"""
+    Records events from a BTSolver. It sits in front of the variables'
+    listener (forwarding to next, e.g. HeuristicScores) and is told about
+    undo by the trail, so domain restores are not recorded as removals.
+"""
+class TraceRecorder:
+
+    # ==================================================================
+    # Constructors
+    # ==================================================================
+
+    def __init__ ( self, path, config = None, bufferSize = 1 << 16 ):
+        self.file = open( path, "wb" )
+        configBytes = json.dumps( config if config != None else {} ).encode()
+        self.file.write( HEADER.pack( MAGIC, VERSION, len(configBytes) ) )
+        self.file.write( configBytes )
+
+        self.buffer = bytearray()
+        self.bufferSize = bufferSize
+        self.start = time.perf_counter_ns()
+
+        self.next = None
+        self.trail = None
+        self.N = 0
+        self.restoring = False
+        self.deciding = False
+
+    # ==================================================================
+    # Output
+    # ==================================================================
+
+    def write ( self, kind, cell, value ):
+        depth = len( self.trail.trailMarker ) if self.trail != None else 0
+        self.buffer += EVENT.pack( kind, min( depth, 0xFFFF ), cell, value, time.perf_counter_ns() - self.start )
+        if len( self.buffer ) >= self.bufferSize:
+            self.flush()
+
+    def flush ( self ):
+        self.file.write( self.buffer )
+        self.buffer = bytearray()
+
+    def close ( self ):
+        self.flush()
+        self.file.close()
+
+    # ==================================================================
+    # Solver Events
+    # ==================================================================
+
+    def startBoard ( self, sboard, trail ):
+        self.trail = trail
+        self.N = sboard.N
+        self.write( BOARD, sboard.p, sboard.q )
+
+    # Called just before the search assigns value to v
+    def decision ( self, v, value ):
+        self.deciding = True
+        self.write( DECIDE, v.row * self.N + v.col, value )
+
+    def propagate ( self, propagator ):
+        self.deciding = False
+        self.write( PROPAGATE, 0, PROPAGATORS.index( propagator ) )
+
+    # ==================================================================
+    # Trail Listener
+    # ==================================================================
+
+    def undoStarted ( self ):
+        self.restoring = True
+        self.deciding = False
+        self.write( UNDO, 0, 0 )
+
+    def undoFinished ( self ):
+        self.restoring = False
+
+    # ==================================================================
+    # Variable Listener
+    # ==================================================================
+
+    def valueRemoved ( self, v, val ):
+        if not self.restoring:
+            self.write( REMOVE, v.row * self.N + v.col, val )
+        if self.next != None:
+            self.next.valueRemoved( v, val )
+
+    def domainReplaced ( self, v, oldValues, newValues ):
+        if not self.restoring and len( newValues ) == 1 and v.isAssigned():
+            if self.deciding:
+                self.deciding = False
+            else:
+                self.write( ASSIGN, v.row * self.N + v.col, newValues[0] )
+        if self.next != None:
+            self.next.domainReplaced( v, oldValues, newValues )
+
+    def assignmentChanged ( self, v, assigned ):
+        if self.next != None:
+            self.next.assignmentChanged( v, assigned )
+
+# ==================================================================
+# Replay
+# ==================================================================
+
+# Returns (config, iterator over event tuples) for a trace file's contents
+def readTrace ( data ):
+    magic, version, configLength = HEADER.unpack_from( data, 0 )
+    if magic != MAGIC or version != VERSION:
+        raise ValueError( "Not a version " + str(VERSION) + " search trace" )
+
+    start = HEADER.size + configLength
+    config = json.loads( data[HEADER.size:start].decode() )
+    end = start + (len(data) - start) // EVENT.size * EVENT.size
+    return ( config, EVENT.iter_unpack( memoryview( data )[start:end] ) )
+
+"""
+    Replays a trace and returns a summary: nodes and backtracks per depth,
+    the most decided-on and most pruned cells, and per propagator the
+    number of firings, removals and implied assignments, and the time from
+    each firing to its last change.
+"""
+def analyze ( data, top = 10 ):
+    config, events = readTrace( data )
+
+    boards = 0
+    N = 0
+    decisionsByDepth = dict()
+    undosByDepth = dict()
+    decisionsByCell = dict()
+    removalsByCell = dict()
+    propagators = dict()
+
+    current = None
+    currentStart = 0
+    lastTime = 0
+
+    for kind, depth, cell, value, stamp in events:
+        if kind == REMOVE or kind == ASSIGN:
+            if kind == REMOVE:
+                removalsByCell[cell] = removalsByCell.get( cell, 0 ) + 1
+            if current != None:
+                current["removals" if kind == REMOVE else "assignments"] += 1
+            lastTime = stamp
+            continue
+
+        # Any other event ends the running propagator
+        if current != None:
+            current["time"] += (lastTime - currentStart) / 1e9
+            current = None
+
+        if kind == PROPAGATE:
+            name = PROPAGATORS[value]
+            current = propagators.setdefault( name, { "firings" : 0, "removals" : 0, "assignments" : 0, "time" : 0.0 } )
+            current["firings"] += 1
+            currentStart = stamp
+        elif kind == DECIDE:
+            decisionsByDepth[depth] = decisionsByDepth.get( depth, 0 ) + 1
+            decisionsByCell[cell] = decisionsByCell.get( cell, 0 ) + 1
+        elif kind == UNDO:
+            undosByDepth[depth] = undosByDepth.get( depth, 0 ) + 1
+        elif kind == BOARD:
+            boards += 1
+            N = cell * value
+        lastTime = stamp
+
+    if current != None:
+        current["time"] += (lastTime - currentStart) / 1e9
+
+    for stats in propagators.values():
+        stats["yield"] = (stats["removals"] + stats["assignments"]) / stats["firings"]
+
+    depths = sorted( set( decisionsByDepth ) | set( undosByDepth ) )
+    return {
+        "config"       : config,
+        "boards"       : boards,
+        "N"            : N,
+        "elapsed"      : lastTime / 1e9,
+        "depths"       : [ (d, decisionsByDepth.get( d, 0 ), undosByDepth.get( d, 0 )) for d in depths ],
+        "hotDecisions" : sorted( decisionsByCell.items(), key = lambda item: -item[1] )[:top],
+        "hotRemovals"  : sorted( removalsByCell.items(), key = lambda item: -item[1] )[:top],
+        "propagators"  : propagators,
+    }
+
+def main ( ):
+    args = sys.argv
+    if len(args) != 2:
+        print( "Usage: SearchTrace.py <trace file>" )
+        return
+
+    try:
+        with open( args[1], "rb" ) as f:
+            summary = analyze( f.read() )
+    except (OSError, ValueError) as e:
+        print( "[ERROR] " + str(e) )
+        return
+
+    print( "Config: " + json.dumps( summary["config"] ) )
+    print( "Boards: " + str(summary["boards"]) + "\tElapsed: " + "%.3f" % summary["elapsed"] + "s" )
+
+    print( "\nDepth\tNodes\tBacktracks" )
+    for depth, nodes, undos in summary["depths"]:
+        print( str(depth) + "\t" + str(nodes) + "\t" + str(undos) )
+
+    N = summary["N"]
+    cellName = lambda cell: "r" + str(cell // N + 1) + "c" + str(cell % N + 1) if N else str(cell)
+
+    print( "\nHottest cells (decisions)" )
+    for cell, count in summary["hotDecisions"]:
+        print( "  " + cellName( cell ) + ": " + str(count) )
+
+    print( "\nHottest cells (removals)" )
+    for cell, count in summary["hotRemovals"]:
+        print( "  " + cellName( cell ) + ": " + str(count) )
+
+    print( "\nPropagator\tFirings\tRemovals\tAssignments\tYield\tTime" )
+    for name, stats in sorted( summary["propagators"].items() ):
+        print( name + "\t" + str(stats["firings"]) + "\t" + str(stats["removals"]) + "\t" + str(stats["assignments"])
+               + "\t" + "%.2f" % stats["yield"] + "\t" + "%.3f" % stats["time"] + "s" )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import SudokuBoard
+import BTSolver
+import Trail
+import Hints
+
+"""
+    Incremental editing session over one propagated constraint network.
+
+    Givens are asserted one at a time: each gets its own trail marker, is
+    assigned, and is propagated with the selected consistency check.
+    Retracting a given undoes the trail back to its marker and replays the
+    givens asserted after it, so nothing is rebuilt from scratch.
+    Consistency is known after every step; solvability is found by a
+    search that is undone afterwards and cached until the givens change.
+"""
+
+class Session:
+
+    # ==================================================================
+    # Constructors
+    # ==================================================================
+
+    def __init__ ( self, p = 3, q = 3, board = None, var_sh = "MinimumRemainingValue", val_sh = "", cc = "forwardChecking" ):
+        self.p = p
+        self.q = q
+        self.N = p*q
+
+        empty = SudokuBoard.SudokuBoard( p, q, board = [ [ 0 for j in range(self.N) ] for i in range(self.N) ] )
+        self.trail = Trail.Trail()
+        self.solver = BTSolver.BTSolver( empty, self.trail, val_sh, var_sh, cc )
+        self.network = self.solver.network
+
+        # (row, col, value, consistent before this given), in assertion order
+        self.givens = []
+        self.consistent = True
+        self.solvable = None
+        self.solution = None
+
+        if board != None:
+            for i in range(self.N):
+                for j in range(self.N):
+                    if board[i][j] != 0:
+                        self.assertGiven( i, j, board[i][j] )
+
+    # ==================================================================
+    # Accessors
+    # ==================================================================
+
+    def getVariable ( self, row, col ):
+        self.checkCell( row, col )
+        return self.network.getVariables()[row * self.N + col]
+
+    # Returns the values still possible for the cell
+    def getCandidates ( self, row, col ):
+        return list( self.getVariable( row, col ).getValues() )
+
+    def getGiven ( self, row, col ):
+        self.checkCell( row, col )
+        for (i, j, value, consistent) in self.givens:
+            if i == row and j == col:
+                return value
+        return 0
+
+    # Returns the givens as a SudokuBoard
+    def getBoard ( self ):
+        board = [ [ 0 for j in range(self.N) ] for i in range(self.N) ]
+        for (i, j, value, consistent) in self.givens:
+            board[i][j] = value
+        return SudokuBoard.SudokuBoard( self.p, self.q, board = board )
+
+    # Returns true if propagating the givens caused no wipeout or clash
+    def isConsistent ( self ):
+        return self.consistent
+
+    """
+        Returns true if the givens have a solution. The search runs on the
+        live network and is undone afterwards; the answer and solution are
+        cached until the givens change.
+    """
+    def isSolvable ( self, time_left = 600 ):
+        if self.solvable != None:
+            return self.solvable
+
+        if not self.consistent:
+            self.solvable = False
+            return False
+
+        level = len( self.trail.trailMarker )
+        self.trail.placeTrailMarker()
+        self.solver.hassolution = False
+        self.solver.solution = None
+        self.solver.tryPattern = True
+        result = self.solver.solve( time_left )
+        if result == -1:
+            self.undoTo( level )
+            return None
+
+        self.solvable = self.solver.hassolution
+        self.solution = self.solver.getSolution() if self.solvable else None
+        self.undoTo( level )
+        return self.solvable
+
+    # Returns a generator of the deductions available from the current state
+    def getHints ( self, techniques = Hints.TECHNIQUES ):
+        return Hints.deductions( self.network, techniques )
+
+    # Returns a solution of the givens, or None if there is none
+    def getSolution ( self ):
+        if self.isSolvable():
+            return self.solution
+        return None
+
+    # ==================================================================
+    # Modifiers
+    # ==================================================================
+
+    """
+        Adds a given and propagates it. Replaces any given already in the
+        cell. Returns whether the session is still consistent.
+    """
+    def assertGiven ( self, row, col, value ):
+        if value < 1 or value > self.N:
+            raise ValueError( "Value must be in 1.." + str(self.N) )
+
+        if self.getGiven( row, col ) != 0:
+            self.retractGiven( row, col )
+
+        self.givens.append( (row, col, value, self.consistent) )
+        self.propagateGiven( row, col, value )
+        self.solvable = None
+        self.solution = None
+        return self.consistent
+
+    """
+        Removes the given in a cell by undoing back to its marker and
+        replaying the givens asserted after it. Returns whether the session
+        is consistent afterwards.
+    """
+    def retractGiven ( self, row, col ):
+        self.checkCell( row, col )
+        for k, (i, j, value, consistent) in enumerate( self.givens ):
+            if i == row and j == col:
+                break
+        else:
+            return self.consistent
+
+        later = self.givens[k + 1:]
+        self.undoTo( k )
+        self.consistent = consistent
+        del self.givens[k:]
+
+        for (i, j, value, wasConsistent) in later:
+            self.givens.append( (i, j, value, self.consistent) )
+            self.propagateGiven( i, j, value )
+
+        self.solvable = None
+        self.solution = None
+        return self.consistent
+
+    # ==================================================================
+    # Helpers
+    # ==================================================================
+
+    """
+        Assigns a given under a new trail marker and propagates it. Once the
+        session is inconsistent givens are only assigned, since propagating
+        over a wiped out domain means nothing; retracting the culprit
+        replays and propagates them.
+    """
+    def propagateGiven ( self, row, col, value ):
+        v = self.getVariable( row, col )
+        clash = not v.getDomain().contains( value )
+
+        self.trail.placeTrailMarker()
+        self.trail.push( v )
+        v.assignValue( value )
+
+        if self.consistent and not clash:
+            self.consistent = self.solver.checkConsistency() and self.network.isConsistent()
+        else:
+            self.consistent = False
+
+    # Raises ValueError for a cell outside the board, which would otherwise
+    # index another cell's variable
+    def checkCell ( self, row, col ):
+        if row < 0 or row >= self.N:
+            raise ValueError( "Row must be in 0.." + str(self.N - 1) )
+        if col < 0 or col >= self.N:
+            raise ValueError( "Column must be in 0.." + str(self.N - 1) )
+
+    # Undoes the trail until only level markers remain
+    def undoTo ( self, level ):
+        while len( self.trail.trailMarker ) > level:
+            self.trail.undo()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import concurrent.futures
+import ipaddress
+import json
+import math
+import os
+import time
+import SudokuBoard
+import ConstraintNetwork
+import BTSolver
+import Trail
+
+"""
+    Long-running solve service. Clients connect over loopback TCP or a Unix
+    socket and exchange JSON lines:
+
+        request:  {"id": 1, "puzzle": "<board>", "timeLimit": 10,
+                   "var": "tournVar", "val": "tournVal", "cc": "tournCC"}
+        response: {"id": 1, "status": "solved", "solution": "<compact>",
+                   "pushes": 120, "backtracks": 3, "time": 0.01}
+
+    The puzzle is either the SudokuBoard text format or a compact N*N
+    character string. The solution is a compact string, or the text format
+    for boards larger than 35x35. Status is one of solved, unsolvable,
+    timeout or error.
+    Sending {"op": "stats"} returns the service counters instead.
+
+    Requests are queued and solved on a pre-warmed process pool. While a
+    worker is idle, whatever is queued is sent at once, one pool call per
+    request, so the pool spreads them over the free workers. Once every
+    worker is busy, requests are grouped into micro-batches: the batcher
+    waits up to the batch window to collect more, then splits the batch
+    into one chunk per worker, and each chunk is a single pool call, so
+    several requests share one round trip. Requests in a chunk are solved
+    one after another and reported separately; each checks its own
+    deadline before it starts, so a hard puzzle can only delay its
+    chunk-mates up to their limits. A request's time limit starts when it is received, so time spent queued
+    counts against it. The server's time limit is both the default and the
+    largest a request may ask for. The queue is bounded, so a full queue
+    stops reading from clients until workers catch up.
+"""
+
+# ==================================================================
+# Worker Side
+# ==================================================================
+
+# Builds the common geometries so the first requests don't pay for them
+def warmWorker ( ):
+    for p, q in [ (3, 3), (2, 3), (4, 4) ]:
+        ConstraintNetwork.getNetworkTemplate( p, q )
+
+def ping ( ):
+    return os.getpid()
+
+# Solves a chunk of requests in one worker call, returning one response each
+def solveChunk ( jobs ):
+    return [ solveJob( job ) for job in jobs ]
+
+# Solves one request in a worker process and returns its response fields.
+# Any failure is reported as an error for this job alone
+def solveJob ( job ):
+    try:
+        return solvePuzzle( job )
+    except Exception as e:
+        return { "status" : "error", "error" : str(e) }
+
+# job ends with the wall-clock deadline, set when the request arrived
+def solvePuzzle ( job ):
+    puzzle, var_sh, val_sh, cc, deadline = job
+    start = time.time()
+    timeLimit = deadline - start
+    if timeLimit <= 0:
+        return { "status" : "timeout", "pushes" : 0, "backtracks" : 0, "time" : 0.0 }
+
+    try:
+        board = SudokuBoard.SudokuBoard( text = puzzle )
+        if len( board.board ) < board.N or any( len( board.board[i] ) != board.N for i in range(board.N) ):
+            raise ValueError( "Board does not have " + str(board.N) + " rows of " + str(board.N) + " cells" )
+    except Exception as e:
+        return { "status" : "error", "error" : str(e) }
+
+    trail = Trail.Trail()
+    pushes = trail.getPushCount()
+    undos = trail.getUndoCount()
+
+    solver = BTSolver.BTSolver( board, trail, val_sh, var_sh, cc )
+    consistent = solver.checkConsistency()
+    # solve() gives up once less than 60 seconds of its budget remain
+    if consistent and solver.solve( time_left = timeLimit + 60 ) == -1:
+        status = "timeout"
+    elif solver.hassolution:
+        status = "solved"
+    else:
+        status = "unsolvable"
+
+    response = {
+        "status"     : status,
+        "pushes"     : trail.getPushCount() - pushes,
+        "backtracks" : trail.getUndoCount() - undos,
+        "time"       : time.time() - start,
+    }
+    if status == "solved":
+        solution = solver.getSolution()
+        # Compact strings only go up to 35x35; larger boards use the file format
+        response["solution"] = solution.toCompactString() if solution.N <= 35 else solution.toFileFormat()
+    return response
+
+# ==================================================================
+# Server
+# ==================================================================
+
+class SolveServer:
+
+    # ==================================================================
+    # Constructors
+    # ==================================================================
+
+    def __init__ ( self, workers = None, batchSize = 16, batchWindow = 0.005, queueSize = 256, timeLimit = 10.0 ):
+        self.workers = workers or os.cpu_count() or 1
+        self.batchSize = batchSize
+        self.batchWindow = batchWindow
+        self.queueSize = queueSize
+        self.timeLimit = timeLimit
+
+        self.pool = None
+        self.queue = None
+        self.batcher = None
+        self.inFlight = set()
+        # Pool calls sent and not yet returned
+        self.busy = 0
+
+        self.startTime = time.time()
+        self.stats = {
+            "requests"   : 0,
+            "solved"     : 0,
+            "unsolvable" : 0,
+            "timeout"    : 0,
+            "error"      : 0,
+            "batches"    : 0,
+            "batched"    : 0,
+            "chunks"     : 0,
+            "solveTime"  : 0.0,
+        }
+
+    # ==================================================================
+    # Lifecycle
+    # ==================================================================
+
+    async def start ( self ):
+        loop = asyncio.get_running_loop()
+        self.pool = concurrent.futures.ProcessPoolExecutor( max_workers = self.workers, initializer = warmWorker )
+        await asyncio.gather( *[ loop.run_in_executor( self.pool, ping ) for i in range(self.workers) ] )
+
+        self.queue = asyncio.Queue( maxsize = self.queueSize )
+        self.batcher = asyncio.create_task( self.runBatcher() )
+
+    async def stop ( self ):
+        if self.batcher != None:
+            self.batcher.cancel()
+        if self.pool != None:
+            self.pool.shutdown( cancel_futures = True )
+
+    # ==================================================================
+    # Batching
+    # ==================================================================
+
+    """
+        Collects queued requests into batches and hands them to the pool.
+        A batch takes what is already queued; only when every worker is
+        busy does it wait up to the window for more and get chunked, since
+        nothing could start sooner anyway.
+    """
+    async def runBatcher ( self ):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [ await self.queue.get() ]
+            while len( batch ) < self.batchSize and not self.queue.empty():
+                batch.append( self.queue.get_nowait() )
+
+            deadline = loop.time() + self.batchWindow
+            while len( batch ) < self.batchSize and self.busy >= self.workers:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append( await asyncio.wait_for( self.queue.get(), remaining ) )
+                except asyncio.TimeoutError:
+                    break
+
+            # Under load, one chunk per worker dealt round robin; otherwise
+            # one call per request, leaving the pool to balance them
+            if self.busy >= self.workers:
+                chunks = min( len( batch ), self.workers )
+            else:
+                chunks = len( batch )
+            self.busy += chunks
+            self.stats["batches"] += 1
+            self.stats["batched"] += len( batch )
+            self.stats["chunks"] += chunks
+            task = asyncio.create_task( self.runBatch( [ batch[i::chunks] for i in range(chunks) ] ) )
+            self.inFlight.add( task )
+            task.add_done_callback( self.inFlight.discard )
+
+    async def runBatch ( self, chunks ):
+        await asyncio.gather( *[ self.runChunk( chunk ) for chunk in chunks ] )
+
+    # Solves a chunk in one pool call and answers each of its requests
+    async def runChunk ( self, chunk ):
+        try:
+            results = await asyncio.get_running_loop().run_in_executor( self.pool, solveChunk, [ job for job, future in chunk ] )
+        except Exception as e:
+            results = [ { "status" : "error", "error" : str(e) } for item in chunk ]
+        finally:
+            self.busy -= 1
+
+        for (job, future), result in zip( chunk, results ):
+            if not future.done():
+                future.set_result( result )
+
+    # ==================================================================
+    # Requests
+    # ==================================================================
+
+    def getStats ( self ):
+        stats = dict( self.stats )
+        stats["uptime"] = time.time() - self.startTime
+        stats["queued"] = self.queue.qsize() if self.queue != None else 0
+        stats["batchesInFlight"] = len( self.inFlight )
+        stats["chunksInFlight"] = self.busy
+        stats["workers"] = self.workers
+        stats["meanBatchSize"] = self.stats["batched"] / self.stats["batches"] if self.stats["batches"] else 0.0
+        stats["meanChunkSize"] = self.stats["batched"] / self.stats["chunks"] if self.stats["chunks"] else 0.0
+        return stats
+
+    async def handleRequest ( self, request ):
+        if request.get( "op" ) == "stats":
+            return self.getStats()
+
+        self.stats["requests"] += 1
+        puzzle = request.get( "puzzle" )
+        if not isinstance( puzzle, str ):
+            self.stats["error"] += 1
+            return { "status" : "error", "error" : "Missing puzzle" }
+
+        try:
+            timeLimit = float( request.get( "timeLimit", self.timeLimit ) )
+            if not math.isfinite( timeLimit ):
+                raise ValueError( "timeLimit must be finite" )
+        except (TypeError, ValueError):
+            self.stats["error"] += 1
+            return { "status" : "error", "error" : "Invalid timeLimit" }
+        # The server's limit is also the most a client may ask for
+        timeLimit = min( timeLimit, self.timeLimit )
+
+        job = ( puzzle,
+                request.get( "var", "tournVar" ),
+                request.get( "val", "tournVal" ),
+                request.get( "cc", "tournCC" ),
+                time.time() + timeLimit )
+        future = asyncio.get_running_loop().create_future()
+
+        # Blocks this client while the queue is full
+        await self.queue.put( (job, future) )
+        result = await future
+
+        self.stats[result["status"]] += 1
+        self.stats["solveTime"] += result.get( "time", 0.0 )
+        return result
+
+    async def respond ( self, line, writer, lock ):
+        try:
+            request = json.loads( line )
+            if not isinstance( request, dict ):
+                raise ValueError( "Request must be a JSON object" )
+        except ValueError as e:
+            response = { "status" : "error", "error" : "Bad request: " + str(e) }
+        else:
+            response = await self.handleRequest( request )
+            if "id" in request:
+                response = dict( response, id = request["id"] )
+
+        async with lock:
+            writer.write( (json.dumps( response ) + "\n").encode() )
+            await writer.drain()
+
+    # Serves one client; responses may be returned out of order
+    async def handleClient ( self, reader, writer ):
+        lock = asyncio.Lock()
+        pending = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+
+                task = asyncio.create_task( self.respond( line, writer, lock ) )
+                pending.add( task )
+                task.add_done_callback( pending.discard )
+
+                # Backpressure: stop reading while the shared queue is full
+                while self.queue.full():
+                    await asyncio.sleep( self.batchWindow )
+
+            if pending:
+                await asyncio.gather( *pending, return_exceptions = True )
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+# ==================================================================
+# Entry Point
+# ==================================================================
+
+def isLoopback ( host ):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address( host ).is_loopback
+    except ValueError:
+        return False
+
+async def serve ( args ):
+    server = SolveServer( args.workers, args.batch, args.window, args.queue, args.timeout )
+    await server.start()
+
+    if args.unix != None:
+        listener = await asyncio.start_unix_server( server.handleClient, path = args.unix )
+        print( "Listening on " + args.unix )
+    else:
+        listener = await asyncio.start_server( server.handleClient, host = args.host, port = args.port )
+        print( "Listening on " + args.host + ":" + str(args.port) )
+
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.stop()
+
+def main ( ):
+    parser = argparse.ArgumentParser( description = "Loopback Sudoku solve service (JSON lines)" )
+    parser.add_argument( "--host", default = "127.0.0.1" )
+    parser.add_argument( "--port", type = int, default = 8765 )
+    parser.add_argument( "--unix", default = None, help = "serve on a Unix socket instead of TCP" )
+    parser.add_argument( "--workers", type = int, default = None )
+    parser.add_argument( "--batch", type = int, default = 16, help = "maximum requests per batch" )
+    parser.add_argument( "--window", type = float, default = 0.005, help = "seconds to wait while filling a batch when every worker is busy" )
+    parser.add_argument( "--queue", type = int, default = 256, help = "maximum queued requests" )
+    parser.add_argument( "--timeout", type = float, default = 10.0, help = "default and maximum per-request time limit in seconds" )
+    args = parser.parse_args()
+
+    if args.unix == None and not isLoopback( args.host ):
+        parser.error( "refusing to listen on non-loopback host " + args.host )
+
+    try:
+        asyncio.run( serve( args ) )
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
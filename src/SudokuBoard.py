@@ -14,7 +14,7 @@ class SudokuBoard:
     # Constructors
     # ==================================================================
 
-    def __init__( self, p = None, q = None, m = None, board = None, filepath = None ):
+    def __init__( self, p = None, q = None, m = None, board = None, filepath = None, text = None ):
         self.p = p
         self.q = q
         try:
@@ -28,23 +28,10 @@ class SudokuBoard:
         elif filepath != None:
             '''read from input file and generate gameboard'''
             with open(filepath) as f:
-                lines = f.readlines()
+                self.readLines( f.readlines() )
 
-                try:
-                    self.p = int(float(lines[0].split()[0]))
-                    self.q = int(float(lines[0].split()[1]))
-                    self.N = self.p*self.q
-                except:
-                    self.p = 3
-                    self.q = 3
-                    self.N = 9
-
-                self.board = []
-                for i in range(1, len(lines)):
-                    tempLine = []
-                    for n in lines[i].split():
-                        tempLine.append(self.odometerToInt(n))
-                    self.board.append(tempLine)
+        elif text != None:
+            self.readText( text )
 
         else:
             if m == None:
@@ -67,6 +54,96 @@ class SudokuBoard:
                     self.board[randomRow][randomCol] = randomAssignment
                     m -= 1
 
+    # ==================================================================
+    # Parsing
+    # ==================================================================
+
+    """
+        Reads the text file format: a "p q" header line followed by N rows of
+        N whitespace-separated cells, 0 (or '.') for an empty cell. Boards
+        with N up to 35 write cells as single base-36 digits (1-9, A-Z);
+        larger boards write them as decimal numbers. Blank lines are
+        ignored; anything else malformed raises ValueError.
+    """
+    def readLines ( self, lines ):
+        try:
+            header = lines[0].split()
+            self.p = int(float(header[0]))
+            self.q = int(float(header[1]))
+            self.N = self.p*self.q
+        except (IndexError, ValueError):
+            raise ValueError( "Board header must start with p and q" )
+
+        if self.p < 1 or self.q < 1:
+            raise ValueError( "Board header must have positive p and q" )
+
+        base = self.tokenBase()
+        self.board = []
+        for i in range(1, len(lines)):
+            tokens = lines[i].split()
+            if not tokens:
+                continue
+
+            try:
+                if '.' in tokens:
+                    tempLine = [ 0 if n == '.' else int(n, base) for n in tokens ]
+                else:
+                    tempLine = [ int(n, base) for n in tokens ]
+            except ValueError:
+                raise ValueError( "Malformed cell on line " + str(i + 1) + ": " + lines[i].strip() )
+
+            self.board.append(tempLine)
+
+        self.validate()
+
+    """
+        Reads a board from a string, either in the text file format or as a
+        compact single-token string of N*N cells (e.g. 81 characters for
+        9x9) where '0' or '.' marks an empty cell. Compact strings must
+        describe a board with square blocks and N up to 35.
+    """
+    def readText ( self, text ):
+        token = text.strip()
+        if len( token.split() ) != 1:
+            self.readLines( text.splitlines() )
+            return
+
+        N = int( round( len(token) ** 0.5 ) )
+        p = int( round( N ** 0.5 ) )
+        if N*N != len(token) or p*p != N:
+            raise ValueError( "Compact board string must have N*N cells with N a perfect square" )
+
+        self.p = p
+        self.q = p
+        self.N = N
+        self.board = [ [ 0 if c == '.' else self.odometerToInt(c) for c in token[i*N:(i+1)*N] ] for i in range(N) ]
+        self.validate()
+
+    # Raises ValueError unless the board is N rows of N values in 0..N
+    def validate ( self ):
+        N = self.N
+        if len(self.board) != N:
+            raise ValueError( "Board has " + str(len(self.board)) + " rows, expected " + str(N) )
+
+        for i, row in enumerate(self.board):
+            if len(row) != N:
+                raise ValueError( "Row " + str(i + 1) + " has " + str(len(row)) + " cells, expected " + str(N) )
+            if min(row) < 0 or max(row) > N:
+                raise ValueError( "Row " + str(i + 1) + " has a value outside 0.." + str(N) )
+
+    # Returns the board as a compact single-token string, '0' for empty cells
+    def toCompactString ( self ):
+        if self.N > 35:
+            raise ValueError( "Compact strings only support boards up to 35x35" )
+        return "".join( self.intToOdometer(self.board[i][j]) for i in range(self.N) for j in range(self.N) )
+
+    # Returns the text file format that readLines parses
+    def toFileFormat ( self ):
+        output = str(self.p) + " " + str(self.q) + "\n"
+        for row in self.board:
+            output += " ".join( self.intToOdometer(n) for n in row ) + "\n"
+        return output
+
     # ==================================================================
     # String representation
     # ==================================================================
@@ -117,7 +194,16 @@ class SudokuBoard:
                     return False
         return True
 
+    # Base used for cell tokens: base 36 up to 35x35, decimal beyond
+    def tokenBase ( self ):
+        if self.N > 35:
+            return 10
+        return 36
+
     def intToOdometer ( self, n ):
+        if self.tokenBase() == 10:
+            return str(n)
+
         alphabet='0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
         toReturn = ''
 
@@ -130,9 +216,6 @@ class SudokuBoard:
 
         return toReturn
 
+    # Parses one cell token; raises ValueError if it is malformed
     def odometerToInt ( self, s ):
-        try:
-            return int( s, 36 )
-
-        except:
-            return 0
+        return int( s, self.tokenBase() )
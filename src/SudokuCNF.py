@@ -0,0 +1,107 @@
+import SudokuBoard
+
+"""
+    CNF encoding of a SudokuBoard for the SAT backend.
+
+    One boolean variable per (row, col, value) that is still possible after
+    removing the values of the givens from their rows, columns and blocks.
+    Givens themselves get no variables. The clauses say that every empty
+    cell holds exactly one value and every row, column and block holds each
+    missing value exactly once; at-most-one is encoded pairwise.
+"""
+
+class SudokuCNF:
+
+    # ==================================================================
+    # Constructors
+    # ==================================================================
+
+    def __init__ ( self, sboard ):
+        self.sboard = sboard
+        self.numVars = 0
+        self.clauses = []
+        self.varOf = dict()
+        self.literals = [ None ]
+
+        N = sboard.N
+        p = sboard.p
+        q = sboard.q
+        board = sboard.board
+
+        units = []
+        for i in range(N):
+            units.append( [ (i, j) for j in range(N) ] )
+        for j in range(N):
+            units.append( [ (i, j) for i in range(N) ] )
+        for b in range(N):
+            r0 = (b // p) * p
+            c0 = (b % p) * q
+            units.append( [ (r0 + i, c0 + j) for i in range(p) for j in range(q) ] )
+
+        unitsOf = dict()
+        for unit in units:
+            for cell in unit:
+                unitsOf.setdefault( cell, [] ).append( unit )
+
+        # Values already placed in each unit; a repeated given is unsatisfiable
+        placed = [ set() for unit in units ]
+        for u, unit in enumerate( units ):
+            for (i, j) in unit:
+                value = board[i][j]
+                if value != 0:
+                    if value in placed[u]:
+                        self.clauses.append( [] )
+                    placed[u].add( value )
+
+        placedOf = dict()
+        for u, unit in enumerate( units ):
+            for cell in unit:
+                placedOf.setdefault( cell, set() ).update( placed[u] )
+
+        # Exactly one value per empty cell
+        for i in range(N):
+            for j in range(N):
+                if board[i][j] != 0:
+                    continue
+
+                cellVars = []
+                for value in range(1, N + 1):
+                    if value not in placedOf[(i, j)]:
+                        cellVars.append( self.newVar( i, j, value ) )
+                self.exactlyOne( cellVars )
+
+        # Exactly one position per missing value in each unit
+        for u, unit in enumerate( units ):
+            for value in range(1, N + 1):
+                if value in placed[u]:
+                    continue
+                self.exactlyOne( [ self.varOf[(i, j, value)] for (i, j) in unit if (i, j, value) in self.varOf ] )
+
+    # ==================================================================
+    # Encoding Helpers
+    # ==================================================================
+
+    def newVar ( self, row, col, value ):
+        self.numVars += 1
+        self.varOf[(row, col, value)] = self.numVars
+        self.literals.append( (row, col, value) )
+        return self.numVars
+
+    def exactlyOne ( self, lits ):
+        self.clauses.append( list( lits ) )
+        for a in range(len( lits )):
+            for b in range(a + 1, len( lits )):
+                self.clauses.append( [ -lits[a], -lits[b] ] )
+
+    # ==================================================================
+    # Decoding
+    # ==================================================================
+
+    # Builds the solved SudokuBoard from a model returned by SATSolver.getModel
+    def decode ( self, model ):
+        board = [ row[:] for row in self.sboard.board ]
+        for v in range(1, self.numVars + 1):
+            if model[v]:
+                row, col, value = self.literals[v]
+                board[row][col] = value
+        return SudokuBoard.SudokuBoard( self.sboard.p, self.sboard.q, board = board )
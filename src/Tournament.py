@@ -0,0 +1,109 @@
+"""
+    Feature-driven heuristic selection for the TOURN configuration.
+
+    A board is summarized by a few cheap features, which are matched against
+    TOURNAMENT_PROFILES to pick the variable selector, value selector and
+    consistency check. The profiles are plain data so they can be retuned
+    from benchmark results without touching the solver.
+"""
+
+# ==================================================================
+# Profiles
+# ==================================================================
+
+"""
+    Each profile is ( conditions, ( var_sh, val_sh, cc ) ). A condition maps
+    a feature name to an inclusive (low, high) range; None leaves that side
+    open. Profiles are tried in order and the first match wins, so the last
+    profile should have no conditions.
+"""
+TOURNAMENT_PROFILES = [
+    # Large boards: over the 16x16 benchmark boards, value ordering and
+    # failure-weighted variable choice had the lowest total solve time
+    ( { "N" : ( 16, None ) },
+      ( "domOverWdeg", "LeastConstrainingValue", "norvigCheck" ) ),
+
+    # Everything else: on 9x9 boards at every clue density norvigCheck beat
+    # forwardChecking, and the variable and value selectors were a wash
+    ( {},
+      ( "MinimumRemainingValue", "", "norvigCheck" ) ),
+]
+
+# ==================================================================
+# Feature Extraction
+# ==================================================================
+
+"""
+    Returns a dictionary of board features:
+        N                 board size
+        clues             number of givens
+        clueRatio         clues / N^2
+        minUnitClues      fewest givens in any row, column or block
+        maxUnitClues      most givens in any row, column or block
+        emptyUnits        number of units without any givens
+        propagationYield  fraction of empty-cell candidates removed by
+                          the givens alone (one round of forward checking)
+"""
+def extractFeatures ( sboard ):
+    N = sboard.N
+    p = sboard.p
+    q = sboard.q
+    board = sboard.board
+
+    rows = [ set() for i in range(N) ]
+    cols = [ set() for i in range(N) ]
+    blocks = [ set() for i in range(N) ]
+
+    clues = 0
+    for i in range(N):
+        for j in range(N):
+            value = board[i][j]
+            if value != 0:
+                clues += 1
+                rows[i].add( value )
+                cols[j].add( value )
+                blocks[(i // p) * p + j // q].add( value )
+
+    removed = 0
+    for i in range(N):
+        for j in range(N):
+            if board[i][j] == 0:
+                removed += len( rows[i] | cols[j] | blocks[(i // p) * p + j // q] )
+
+    empty = N*N - clues
+    unitClues = [ len(u) for u in rows + cols + blocks ]
+
+    return {
+        "N"                : N,
+        "clues"            : clues,
+        "clueRatio"        : clues / (N*N),
+        "minUnitClues"     : min( unitClues ),
+        "maxUnitClues"     : max( unitClues ),
+        "emptyUnits"       : unitClues.count( 0 ),
+        "propagationYield" : removed / (empty * N) if empty > 0 else 1.0,
+    }
+
+# ==================================================================
+# Profile Selection
+# ==================================================================
+
+# Returns true if every condition of the profile holds for the features
+def matchesProfile ( features, conditions ):
+    for name, (low, high) in conditions.items():
+        value = features[name]
+        if low != None and value < low:
+            return False
+        if high != None and value > high:
+            return False
+    return True
+
+# Returns (var_sh, val_sh, cc) for the first profile matching the features
+def selectHeuristics ( features, profiles = None ):
+    if profiles == None:
+        profiles = TOURNAMENT_PROFILES
+
+    for conditions, heuristics in profiles:
+        if matchesProfile( features, conditions ):
+            return heuristics
+
+    return ( "MinimumRemainingValue", "", "forwardChecking" )
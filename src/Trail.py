@@ -9,12 +9,6 @@ import copy
 
 class Trail:
 
-    # ==================================================================
-    # Properties
-    # ==================================================================
-    numPush = 0
-    numUndo = 0
-
     # ==================================================================
     # Constructor
     # ==================================================================
@@ -22,6 +16,11 @@ class Trail:
     def __init__ ( self ):
         self.trailStack  = []
         self.trailMarker = []
+        self.listener    = None
+
+        # Counts are per trail, so solvers in different threads keep their own
+        self.numPush = 0
+        self.numUndo = 0
 
     # ==================================================================
     # Accessors
@@ -31,10 +30,10 @@ class Trail:
         return len( self.trailStack )
 
     def getPushCount ( self ):
-        return Trail.numPush
+        return self.numPush
 
     def getUndoCount ( self ):
-        return Trail.numUndo
+        return self.numUndo
 
     # ==================================================================
     # Modifiers
@@ -51,14 +50,23 @@ class Trail:
         you can restore propagated domains correctly.
     """
     def push ( self, v ):
-        Trail.numPush += 1
+        self.numPush += 1
         domainCopy = Domain.Domain( [i for i in v.getValues()] )
         vPair = [v, domainCopy]
         self.trailStack.append(vPair)
 
+    """
+        Sets an object to be told when undo starts and finishes restoring
+        domains. It must provide undoStarted() and undoFinished().
+    """
+    def setListener ( self, listener ):
+        self.listener = listener
+
     # Pops and restores variables on the trail until the last trail marker
     def undo ( self ):
-        Trail.numUndo += 1
+        self.numUndo += 1
+        if self.listener != None:
+            self.listener.undoStarted()
         targetSize = self.trailMarker.pop() # targetSize target position on the trail to backtrack to
         size = len(self.trailStack)
         while size > targetSize:
@@ -69,6 +77,9 @@ class Trail:
             v.unassign()
             size -= 1
 
+        if self.listener != None:
+            self.listener.undoFinished()
+
     # Clears the trail
     def clear ( self ):
         self.trailStack = []
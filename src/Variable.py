@@ -5,23 +5,29 @@ import Domain
     Represents a variable in a CSP
 """
 
-STATIC_NAMING_COUNTER = 1
-
 class Variable:
 
     # ==================================================================
     # Constructors
     # ==================================================================
 
-    def __init__ ( self, possible_Values, row, col, block ):
-        global STATIC_NAMING_COUNTER
-        self.name = "v" + str(STATIC_NAMING_COUNTER)
-        STATIC_NAMING_COUNTER += 1
+    # Names come from the caller (the network numbers its cells) rather than
+    # a shared counter, so networks can be built concurrently
+    def __init__ ( self, possible_Values, row, col, block, name = None ):
+        self.name = name if name != None else "r" + str(row + 1) + "c" + str(col + 1)
 
-        self.domain = Domain.Domain( possible_Values )
         self.row = row
         self.col = col
         self.block = block
+        self.listener = None
+        self.reset( possible_Values )
+
+    """
+        Reinitializes the domain and flags, e.g. to load a new board's givens.
+        Listeners are not notified; they should be rebuilt after a reset.
+    """
+    def reset ( self, possible_Values ):
+        self.domain = Domain.Domain( possible_Values )
         if self.size() == 1: # D = [4], assisgn variable to 4 which means modified & assigned and can't be changed because right answer
             self.assigned = True
             self.modified = True
@@ -79,7 +85,17 @@ class Variable:
         self.modified = mod
         self.domain.modified = mod
 
+    """
+        Sets an object to be told about domain and assignment changes. It
+        must provide valueRemoved(v, val), domainReplaced(v, old, new) and
+        assignmentChanged(v, assigned).
+    """
+    def setListener ( self, listener ):
+        self.listener = listener
+
     def unassign(self):
+        if self.assigned and self.listener != None:
+            self.listener.assignmentChanged( self, False )
         self.assigned = False
 
     # Assign a value to the variable
@@ -87,6 +103,8 @@ class Variable:
         if not self.changeable:
             return
 
+        if not self.assigned and self.listener != None:
+            self.listener.assignmentChanged( self, True )
         self.assigned = True
         self.setDomain( Domain.Domain( val ) )
 
@@ -96,6 +114,8 @@ class Variable:
             return
 
         if self.domain != d:
+            if self.listener != None:
+                self.listener.domainReplaced( self, self.domain.values, d.values )
             self.domain = d
             self.modified = True
 
@@ -104,7 +124,8 @@ class Variable:
         if not self.changeable:
             return
 
-        self.domain.remove( val )
+        if self.domain.remove( val ) and self.listener != None:
+            self.listener.valueRemoved( self, val )
         self.modified = self.domain.isModified()
 
     # ==================================================================